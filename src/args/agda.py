@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
+import sys
+import time
 from typing import *
 from typing import IO
 
 import click
 from click_help_colors import HelpColorsGroup
+from tabulate import tabulate
 
 from commands import *
-from commands import Range
+from commands import Range, Record, range_parser
+from interaction import CACHEABLE, HighlightingInfo, InteractionPoints, QueryCache, RunningInfo, Response, Session
 from interpret import *
 
 CONTEXT_SETTINGS = {
@@ -33,25 +38,119 @@ interaction_help = 'Interaction id, defaults to 0'
              chain=True,
              invoke_without_command=True,
              context_settings=CONTEXT_SETTINGS)
-def agda():
+@click.option('-o', '--output', 'output', type=click.Choice(['table', 'json']), default='table', help='Format of the report, defaults to `table`')
+@click.option('--cache/--no-cache', 'cache', default=True, help='Answer top-level queries from ~/.refl/queries when the loaded modules did not change')
+def agda(output: str = 'table', cache: bool = True):
   """Interact with Agda
+
+  Chained commands run in order against one Agda process, e.g. `refl agda load -f A.agda goal_type -i 0`.
+  A file given to one command is used by the following ones as well.
   """
   pass
 
 
 @agda.resultcallback()
-def cli_process_commands(processors):
-  cmds = Commands(processors[0][1]['file'].name)
-
-  # remove all file arguments
-  [p[1].pop('file') if 'file' in p[1] else None for p in processors]
-
-  commands = [p[0] for p in processors]
-  args = [p[1] for p in processors]
-
-  cs = [getattr(cmds, c)(**a) if hasattr(cmds, c) else Exception('Wrong command perhaps: ' + c) for c, a in list(zip(commands, args))]
-
-  repl.run(cs)
+def cli_process_commands(processors, output: str = 'table', cache: bool = True):
+  if len(processors) == 0:
+    return
+  if processors[0][1].get('file') is None:
+    raise click.UsageError('The first command needs a file, pass it with --file')
+
+  rows = []
+  with Session(processors[0][1]['file'].name) as session:
+    cmds = session.commands
+    queries = QueryCache(agda=session.agda, flags=session.flags) if cache else None
+    for command, a in processors:
+      f = a.pop('file', None)
+      if f is not None:
+        cmds.srcFile = f.name
+
+      # Ranges given with --where are resolved against the file
+      if 'where' in a:
+        try:
+          a['where'] = range_parser(cmds.srcFile, a['where']) if a['where'] is not None else Range()
+        except ValueError as e:
+          raise click.BadParameter(str(e), param_hint='--where')
+
+      if command == 'goals':
+        rows += goals(session, **a)
+        if queries is not None:
+          queries.load(cmds.srcFile, a['cmds'])
+        continue
+      elif command == 'abort':
+        # Chained commands run one after the other, by now there is none left to abort
+        responses = []
+      elif command == 'load':
+        responses = session.load(**a)
+        if queries is not None:
+          queries.load(cmds.srcFile, a['cmds'])
+      elif queries is not None and command in CACHEABLE and session.loaded == cmds.srcFile:
+        responses = cached(session, queries, build(cmds, command, a))
+      else:
+        responses = session.send(build(cmds, command, a), cmds.history.last)
+      rows.append(report_row(cmds.srcFile, command, cmds.history.last, responses))
+
+  if output == 'json':
+    print(json.dumps(rows, ensure_ascii=False, default=str))
+  else:
+    print(tabulate([[i, r['command'], r['interactionId'], '✓' if r['ok'] else '✗', r['latency'], r['output']] for i, r in enumerate(rows)],
+                   headers=['#', 'Command', 'Goal', 'OK', 'Latency (ms)', 'Output'],
+                   tablefmt='fancy_grid'))
+  sys.exit(0 if all([r['ok'] for r in rows]) else 1)
+
+
+def build(cmds: Commands, command: str, a: Dict[str, Any]) -> str:
+  # The builders check the values they are given, bad ones are reported like click reports bad options
+  try:
+    return getattr(cmds, command)(**a)
+  except AssertionError as e:
+    raise click.BadParameter(str(e), param_hint=command)
+
+
+def report_row(srcFile: str, command: str, record: Optional[Record], responses: List[Response]) -> Dict[str, Any]:
+  latency = record.latency if record is not None else None
+  return {
+    'command': command,
+    'file': srcFile,
+    'interactionId': record.interactionId if record is not None else None,
+    'ok': ok(responses),
+    'latency': round(latency * 1000, 3) if latency is not None else None,
+    'output': '\n'.join([str(r) for r in responses if str(r) != '']),
+    'responses': [r.data for r in responses if not isinstance(r, (HighlightingInfo, RunningInfo))],
+  }
+
+
+def cached(session: Session, queries: QueryCache, command: str) -> List[Response]:
+  # Only answers which Agda gave without errors are kept
+  record = session.commands.history.last
+  started = time.perf_counter()
+  key = queries.key(session.commands.srcFile, command)
+  responses = queries.get(key)
+  if responses is not None:
+    record.latency = time.perf_counter() - started
+    return responses
+
+  responses = session.send(command, record)
+  if ok(responses):
+    queries.put(key, responses)
+  return responses
+
+
+def goals(session: Session, rewrite: str = 'Simplified', cmds: List[str] = []) -> List[Dict[str, Any]]:
+  # The file is loaded once, then the queries for all of its goals are written in one go and answered back to back
+  commands = session.commands
+  responses = session.load(cmds)
+  rows = [report_row(commands.srcFile, 'load', commands.history.last, responses)]
+
+  ids = [i for r in responses if isinstance(r, InteractionPoints) for i in r.ids]
+  if len(ids) == 0:
+    return rows
+  with commands.batch() as batch:
+    for i in ids:
+      commands.goal_type_context(rewrite, i, Range(), '')
+  for record, responses in zip(batch.records, session.send_batch(batch)):
+    rows.append(report_row(commands.srcFile, 'goal_type_context', record, responses))
+  return rows
 
 
 @agda.command('compile')
@@ -59,14 +158,15 @@ def cli_process_commands(processors):
 @click.option('-b',
               '--backend',
               'backend',
-              type=str,
+              type=click.Choice(backends),
+              default='GHCNoMain',
               help='Backend to use, \
-    can be one of `GHC`, `GHCNoMain`, `LaTeX`, `QuickLaTeX`, if in doubt use `GHCNoMain`')
+    can be one of `GHC`, `GHCNoMain`, `LaTeX`, `QuickLaTeX`, defaults to `GHCNoMain`')
 @click.option('-c', '--cmds', 'cmds', type=str, help='Commands, comma-separated')
-def compile_cmd(file: IO[str], backend: str, cmds: str):
+def compile_cmd(file: IO[str], backend: str = 'GHCNoMain', cmds: str = ''):
   """Compile agda code in a file.
   """
-  cmds_ = cmds.strip().split(',') if cmds else None
+  cmds_ = cmds.strip().split(',') if cmds else []
   return ('compile', {'backend': backend, 'file': file, 'cmds': cmds_})
 
 
@@ -76,10 +176,21 @@ def compile_cmd(file: IO[str], backend: str, cmds: str):
 def load_cmd(file: IO[str], cmds: str):
   """Load a file and type check it.
   """
-  cmds_ = cmds.strip().split(',') if cmds else None
+  cmds_ = cmds.strip().split(',') if cmds else []
   return ('load', {'file': file, 'cmds': cmds_})
 
 
+@agda.command('goals')
+@click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
+@click.option('-p', '--cmds', default='', type=str, multiple=False, help='Paths to include, comma-separated.')
+def goals_cmd(file: IO[str], rewrite: str = 'Simplified', cmds: str = ''):
+  """Load a file and show the type and context of every goal in it.
+  """
+  cmds_ = cmds.strip().split(',') if cmds else []
+  return ('goals', {'file': file, 'rewrite': rewrite, 'cmds': cmds_})
+
+
 @agda.command('constraints')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 def constraints_cmd(file: IO[str]):
@@ -90,7 +201,7 @@ def constraints_cmd(file: IO[str]):
 
 @agda.command('metas')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-def metas_cmd():
+def metas_cmd(file: IO[str]):
   """Show all goals in a file.
   """
   return ('metas', {'file': file})
@@ -98,37 +209,36 @@ def metas_cmd():
 
 @agda.command('show_module_contents_toplevel')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 def show_module_contents_toplevel_cmd(file: IO[str], rewrite: str = 'Simplified', expr: str = ''):
   """List all module contents.
   """
-  return ('', {'file': file, 'rewrite': rewrite, 'expr': expr})
+  return ('show_module_contents_toplevel', {'file': file, 'rewrite': rewrite, 'expr': expr})
 
 
 @agda.command('search_about_toplevel')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 def search_about_toplevel_cmd(file: IO[str], rewrite: str = 'Simplified', expr: str = ''):
   """Search about a keyword.
   """
-  return ('', {'file': file, 'rewrite': rewrite, 'expr': expr})
+  return ('search_about_toplevel', {'file': file, 'rewrite': rewrite, 'expr': expr})
 
 
 @agda.command('solveAll')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
-@click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
-def solveAll_cmd(file: IO[str], rewrite: str = 'Simplified', expr: str = ''):
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
+def solveAll_cmd(file: IO[str], rewrite: str = 'Simplified'):
   """Solve all constraints in a file.
   """
-  return ('', {'file': file, 'rewrite': rewrite, 'expr': expr})
+  return ('solveAll', {'file': file, 'rewrite': rewrite})
 
 
 @agda.command('solveOne')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -165,12 +275,13 @@ def autoOne_cmd(file: IO[str], interactionId: int = 0, where: Range = None, expr
 def auto_cmd(file: IO[str], interactionId: int = 0, where: Range = None, expr: str = ''):
   """Automatic proof search, find proofs, specific hole.
   """
-  return ('autoOne', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where})
+  return ('auto', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where})
 
 
 @agda.command('infer_toplevel')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
+@click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 def infer_toplevel_cmd(file: IO[str], rewrite: str = 'Simplified', expr: str = ''):
   """Infer all types in file.
   """
@@ -180,7 +291,7 @@ def infer_toplevel_cmd(file: IO[str], rewrite: str = 'Simplified', expr: str = '
 @agda.command('compute_toplevel')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
-@click.option('-c', '--computeMode', 'computeMode', type=str, default='DefaultCompute', help=compute_help)
+@click.option('-c', '--computeMode', 'computeMode', type=click.Choice(computeModes), default='DefaultCompute', help=compute_help)
 def compute_toplevel_cmd(file: IO[str], computeMode: str = 'DefaultCompute', expr: str = ''):
   """Compute the normal form, whole file.
   """
@@ -197,8 +308,8 @@ def load_highlighting_info_cmd(file: IO[str]):
 
 @agda.command('tokenHighlighting')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--remove', 'remove', type=str, help='`Remove` or `Keep`, defaults to Keep')
-def tokenHighlighting_cmd(file: IO[str], remove: str):
+@click.option('-r', '--remove', 'remove', type=click.Choice(removeOrKeep), default='Keep', help='`Remove` or `Keep`, defaults to `Keep`')
+def tokenHighlighting_cmd(file: IO[str], remove: str = 'Keep'):
   """Highlight token.
   """
   return ('tokenHighlighting', {'file': file, 'remove': remove})
@@ -207,7 +318,7 @@ def tokenHighlighting_cmd(file: IO[str], remove: str):
 @agda.command('highlight')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
-@click.option('-w', '--where', 'where', type=str, default=Range(), help=range_help)
+@click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
 def highlight_cmd(file: IO[str], interactionId: int = 0, where: Range = None):
   """Highlight file.
   """
@@ -217,11 +328,13 @@ def highlight_cmd(file: IO[str], interactionId: int = 0, where: Range = None):
 @agda.command('give')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
-@click.option('-w', '--where', 'where', type=str, default=Range(), help=range_help)
-def give_cmd(file: IO[str], force: str, interactionId: int = 0, where: Range = None, expr: str = ''):
+@click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
+@click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
+@click.option('--force', 'force', type=click.Choice(useForce), default='WithoutForce', help='`WithForce` or `WithoutForce`, defaults to `WithoutForce`')
+def give_cmd(file: IO[str], force: str = 'WithoutForce', interactionId: int = 0, where: Range = None, expr: str = ''):
   """Fill a goal.
   """
-  return ('give', {'file': file, 'interactionId': interactionId, 'where': where})
+  return ('give', {'file': file, 'force': force, 'expr': expr, 'interactionId': interactionId, 'where': where})
 
 
 @agda.command('refine')
@@ -232,18 +345,16 @@ def give_cmd(file: IO[str], force: str, interactionId: int = 0, where: Range = N
 def refine_cmd(file: IO[str], interactionId: int = 0, where: Range = None, expr: str = ''):
   """Refine: makes new holes for missing arguments.
   """
-  return ('refine', {
-    'file': file,
-  })
+  return ('refine', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where})
 
 
 @agda.command('intro')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
-@click.option('-w', '--where', 'where', type=str, default=Range(), help=range_help)
-@click.option('-w', '--whether', 'whether', type=bool, help='Whether to (?), defaults to false')
-def intro_cmd(file: IO[str], whether: bool, interactionId: int = 0, where: Range = None, expr: str = ''):
+@click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
+@click.option('--whether/--no-whether', 'whether', default=False, help='Whether to introduce pattern matching lambdas, defaults to no')
+def intro_cmd(file: IO[str], whether: bool = False, interactionId: int = 0, where: Range = None, expr: str = ''):
   """Give information about holes.
   """
   return ('intro', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where, 'whether': whether})
@@ -253,17 +364,17 @@ def intro_cmd(file: IO[str], whether: bool, interactionId: int = 0, where: Range
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
-@click.option('-w', '--where', 'where', type=str, default=Range(), help=range_help)
-@click.option('-w', '--whether', 'whether', type=bool, help='Whether to (?), defaults to false')
-def refine_or_intro_cmd(file: IO[str], whether: bool, interactionId: int = 0, where: Range = None, expr: str = ''):
+@click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
+@click.option('--whether/--no-whether', 'whether', default=False, help='Whether to introduce pattern matching lambdas, defaults to no')
+def refine_or_intro_cmd(file: IO[str], whether: bool = False, interactionId: int = 0, where: Range = None, expr: str = ''):
   """Refine. Partial give: makes new holes for missing arguments.
   """
-  return ('intro', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where, 'whether': whether})
+  return ('refine_or_intro', {'file': file, 'expr': expr, 'interactionId': interactionId, 'where': where, 'whether': whether})
 
 
 @agda.command('context')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -275,7 +386,7 @@ def context_cmd(file: IO[str], rewrite: str = 'Simplified', interactionId: int =
 
 @agda.command('helper_function')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -287,7 +398,7 @@ def helper_function_cmd(file: IO[str], rewrite: str = 'Simplified', interactionI
 
 @agda.command('infer')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -299,7 +410,7 @@ def infer_cmd(file: IO[str], rewrite: str = 'Simplified', interactionId: int = 0
 
 @agda.command('goal_type')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -311,7 +422,7 @@ def goal_type_cmd(file: IO[str], rewrite: str = 'Simplified', interactionId: int
 
 @agda.command('elaborate_give')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -323,7 +434,7 @@ def elaborate_give_cmd(file: IO[str], rewrite: str = 'Simplified', interactionId
 
 @agda.command('goal_type_context')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -335,7 +446,7 @@ def goal_type_context_cmd(file: IO[str], rewrite: str = 'Simplified', interactio
 
 @agda.command('goal_type_context_infer')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -347,7 +458,7 @@ def goal_type_context_infer_cmd(file: IO[str], rewrite: str = 'Simplified', inte
 
 @agda.command('goal_type_context_check')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -359,7 +470,7 @@ def goal_type_context_check_cmd(file: IO[str], rewrite: str = 'Simplified', inte
 
 @agda.command('show_module_contents')
 @click.option('-f', '--file', 'file', type=click.File('r'), multiple=False, help=file_help)
-@click.option('-r', '--rewrite', 'rewrite', type=str, default='Simplified', help=rewrite_help)
+@click.option('-r', '--rewrite', 'rewrite', type=click.Choice(rewriteModes), default='Simplified', help=rewrite_help)
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
@@ -396,7 +507,7 @@ def why_in_scope_cmd(file: IO[str], interactionId: int = 0, where: Range = None,
 @click.option('-e', '--expr', 'expr', type=str, default='', help=expr_help)
 @click.option('-i', '--interactionId', 'interactionId', type=int, default=0, help=interaction_help)
 @click.option('-w', '--where', 'where', type=str, default=None, help=range_help)
-@click.option('-c', '--computeMode', 'computeMode', type=str, default='DefaultCompute', help=compute_help)
+@click.option('-c', '--computeMode', 'computeMode', type=click.Choice(computeModes), default='DefaultCompute', help=compute_help)
 def compute_cmd(file: IO[str], computeMode: str = 'DefaultCompute', interactionId: int = 0, where: Range = None, expr: str = ''):
   """Compute the normal form of either selected code or given expression.
   """
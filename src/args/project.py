@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 from typing import *
 
 import click
@@ -8,7 +9,7 @@ from click_help_colors import HelpColorsGroup
 from giturlparse import parse as git_parse
 from prompt_toolkit import prompt
 
-from packages import GitOptions, InstallPackage, LocalOptions, Origin, Package, Project, UninstallPackage
+from packages import OK, Build, GitOptions, InstallPackage, LocalOptions, Origin, Package, Project, UninstallPackage
 from util.log import LOGLEVEL, Logging
 
 log = Logging(LOGLEVEL)()
@@ -176,3 +177,22 @@ def init():
   include = "src" if include is None or include == "" else include
 
   Project.init(".", name, [include])
+
+
+@project.command('build')
+@click.option('-j', '--jobs', 'jobs', type=int, default=None, help='Number of Agda processes to run at once, defaults to the number of CPUs')
+@click.option('-i', '--include-path', 'includes', type=str, multiple=True, help='More directories to look for modules in')
+@click.option('-q', '--quiet', 'quiet', type=bool, is_flag=True, help='Do not show progress')
+def build(jobs: Optional[int] = None, includes: Tuple[str, ...] = (), quiet: bool = False):
+  """Typecheck every module of the project
+
+  The modules it imports from libraries are checked first, by a single Agda process.
+  """
+  p = Project.load("project.refl")
+  results = Build(list(p.project.includes or []) + list(includes), jobs)(progress=not quiet)
+
+  failed = [r for r in results if r.status != OK]
+  for r in failed:
+    log.error(f"{r.module} ({r.srcFile}) {r.status}:\n{r.output.strip()}")
+  log.info(f"{len(results) - len(failed)} of {len(results)} modules checked, {len(failed)} failed or skipped")
+  sys.exit(1 if len(failed) > 0 else 0)
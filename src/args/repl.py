@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 from typing import *
 
 import click
@@ -32,14 +33,16 @@ def repl():
 def repl_process_commands(processors):
   if 'repl' in [p for p, _ in processors]:
     args = [a for p, a in processors if p == 'repl'][0]
-    Repl(args).run()
+    sys.exit(Repl(args).run())
 
 
 @repl.command('agda')
 @click.option('-p', '--prelude', 'prelude', type=str, multiple=False, help='File to load as prelude to the REPL')
 @click.option('-i', '--include-path', 'includes', type=list[str], multiple=True, help='Directories to look for including modules')
 @click.option('-l', '--library', 'library', type=str, multiple=False, help='Use library in directory')
-def agda(prelude: str, includes: list[str], library: str):
+@click.option('-r', '--resume', 'resume', type=str, multiple=False, help='Resume a session saved with :save NAME')
+@click.option('-s', '--script', 'script', type=str, multiple=False, help='Run the inputs in a file (- for stdin) and print results as JSON lines')
+def agda(prelude: str, includes: list[str], library: str, resume: str, script: str):
   """Start an Agda REPL.
   """
-  return ('repl', {'prelude': prelude, 'includes': includes, 'library': library})
+  return ('repl', {'prelude': prelude, 'includes': includes, 'library': library, 'resume': resume, 'script': script})
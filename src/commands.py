@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import inspect
+import json
+import re
+from collections import deque
+from contextlib import contextmanager
 from os import path
 from typing import *
+from typing import IO
 
 from config import *
-from util import flatten
+from source.holes import Hole
+from source.holes import index as hole_index
+from source.lines import line_index
 from util.log import Logging
 
 log = Logging()()
@@ -16,6 +24,9 @@ computeModes: List[str] = ["DefaultCompute", "IgnoreAbstract", "UseShowInstance"
 removeOrKeep: List[str] = ["Remove", "Keep"]
 useForce: List[str] = ["WithForce", "WithoutForce"]
 
+HISTORY = 1024
+ARGUMENT = 64
+
 
 class Position:
   def __init__(self: Any, srcFile: str, position: int, line: int, column: int):
@@ -44,16 +55,19 @@ class Range:
     self.intervals = intervals
 
   def __call__(self: Any):
-    p = self.intervals[0].start.srcFile if len(self.intervals) > 0 else None
-    intervals = flatten([i() for i in self.intervals])
-    return 'noRange' if len(self.intervals) == 0 else \
-      '(intervalsToRange (Just (mkAbsolute "{p}")) {intervals})'.format(p=p, intervals=' '.join(intervals))
+    if len(self.intervals) == 0:
+      return 'noRange'
+    p = self.intervals[0].start.srcFile
+    # Agda reads the intervals as one Haskell list
+    intervals = '[' + ', '.join([' '.join(['Interval '] + i.start() + i.end()) for i in self.intervals]) + ' ]'
+    return '(intervalsToRange (Just (mkAbsolute "{p}")) {intervals})'.format(p=p, intervals=intervals)
 
 
 def range_builder(f: str, l1: int, c1: int, l2: int, c2: int) -> Range:
   assert path.exists(f)
-  p1 = (l1 * c1) + 1
-  p2 = (l2 * c2) + 1
+  lines = line_index(f)
+  p1 = lines.offset(l1, c1)
+  p2 = lines.offset(l2, c2)
 
   pos1 = Position(f, p1, l1, c1)
   pos2 = Position(f, p2, l2, c2)
@@ -62,356 +76,298 @@ def range_builder(f: str, l1: int, c1: int, l2: int, c2: int) -> Range:
   return Range([intr])
 
 
-def range_parser_validator(r: str) -> bool:
-  y = [x for x in r.strip().split(' ') if x not in ['(', ')', ',']]
-
-  assert (len(y) == 4 or len(y) == 2)
-  return False
-
-
-class Commands:
-  def __init__(self: Any, srcFile: str):
-    assert path.exists(srcFile)
-
-    self.history: List[str] = []
-    self.srcFile = srcFile
-
-  def __get__(self: Any, command: str):
-    assert hasattr(self, command)
-
-    method = getattr(self, command)
-    return method
-
-  def wrap(self: Any, command: str):
-    return 'IOTCM "{srcFile}" NonInteractive Indirect ({command})'\
-      .format(srcFile=self.srcFile, command=command)
-
-  def wrap_global(self: Any, command: str):
-    return 'IOTCM "{srcFile}" None Indirect ({command})'\
-      .format(srcFile=self.srcFile, command=command)
-
-  def compile(self: Any, backend: str, cmds: List[str]) -> str:
-
-    assert backend in backends, \
-        backend + ' should be on of ' + ', '.join(backends)
-
-    command = 'Cmd_compile {backend} "{src}" [{commands}]'.format(backend=backend,
-                                                                  src=self.srcFile,
-                                                                  commands=','.join(["\"" + c + "\"" for c in cmds]))
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def load(self: Any, cmds: List[str]) -> str:
-
-    command = 'Cmd_load "{src}" [{commands}]'.format(src=self.srcFile, commands=','.join(["\"" + c + "\"" for c in cmds]))
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def constraints(self: Any) -> str:
-    command = 'Cmd_constraints'
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def metas(self: Any) -> str:
-    command = 'Cmd_metas'
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def show_module_contents_toplevel(self: Any, rewrite: str = 'Simplified', expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-
-    command = 'Cmd_show_module_contents_toplevel {rewrite} "{expr}"'.format(rewrite=rewrite, expr=expr)
-
-    self.history.append(command)
-    return self.wrap_global(command)
-
-  def search_about_toplevel(self: Any, rewrite: str = 'Simplified', expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-
-    command = 'Cmd_search_about_toplevel {rewrite} "{expr}"'.format(rewrite=rewrite, expr=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def solveAll(self: Any, rewrite: str = 'Simplified') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-
-    command = 'Cmd_solveAll {rewrite}'.format(rewrite=rewrite)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def solveOne(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-
-    command = 'Cmd_solveOne {rewrite} {interactionId} {where} "{expr}"'.format(rewrite=rewrite,
-                                                                               interactionId=str(interactionId),
-                                                                               where=where(),
-                                                                               expr=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def autoAll(self: Any) -> str:
-    command = 'Cmd_autoAll'
-
-    self.history.append(command)
-    return self.wrap(command)
+_N = r'\s*(\d+)\s*'
+_INTERVAL = rf'\({_N},{_N}\)|\(\s*\({_N},{_N}\)\s*,\s*\({_N},{_N}\)\s*\)'
+INTERVAL = re.compile(_INTERVAL)
+RANGE = re.compile(rf'\s*(\[\s*)?(?:{_INTERVAL})(?:\s*,\s*(?:{_INTERVAL}))*\s*(?(1)\]|)\s*')
 
-  def autoOne(self: Any, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
 
-    command = 'Cmd_autoOne {interactionId} {where} "{expr}"'.format(interactionId=str(interactionId), where=where(), expr=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def auto(self: Any, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-
-    command = 'Cmd_auto {interactionId} {where} "{expr}"'.format(interactionId=str(interactionId), where=where(), expr=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def infer_toplevel(self: Any, rewrite: str = 'Simplified', expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-
-    command = 'Cmd_infer_toplevel {rewrite} "{expr}"'.format(rewrite=rewrite, expr=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def compute_toplevel(self: Any, computeMode: str = 'DefaultCompute', expr: str = '') -> str:
-    assert computeMode in computeModes, \
-        computeMode + ' should be on of ' + ', '.join(computeModes)
-
-    command = 'Cmd_compute_toplevel {computeMode} "{expr}"'.format(computeMode=computeMode, expr=expr)
-
-    self.history.append(command)
-    return self.wrap_global(command)
-
-  def load_highlighting_info(self: Any) -> str:
-    command = 'Cmd_load_highlighting_info "{src}"'.format(src=self.srcFile)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def tokenHighlighting(self: Any, remove: str) -> str:
-    assert remove in removeOrKeep, \
-        remove + ' should be on of ' + ', '.join(removeOrKeep)
-
-    command = 'Cmd_tokenHighlighting "{src}" {remove}'.format(src=self.srcFile, remove=remove)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def highlight(self: Any, interactionId: int = 0, where: Range = Range()) -> str:
-
-    command = 'Cmd_highlight {interactionId} {where} "{src}"'.format(interactionId=str(interactionId), where=where(), src=self.srcFile)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def give(self: Any, force: str, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert force in useForce, \
-        force + ' should be on of ' + ', '.join(useForce)
-    expr = expr if expr != '' else self.srcFile
-
-    command = 'Cmd_give {force} {interactionId} {where} "{src}"'.format(force=force, interactionId=str(interactionId), where=where(), src=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def refine(self: Any, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    expr = expr if expr != '' else self.srcFile
-
-    command = 'Cmd_refine {interactionId} {where} "{src}"'.format(interactionId=str(interactionId), where=where(), src=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def intro(self: Any, whether: bool, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    expr = expr if expr != '' else self.srcFile
-
-    command = 'Cmd_intro {whether} {interactionId} {where} "{src}"'.format(whether='True' if whether else 'False',
-                                                                           interactionId=str(interactionId),
-                                                                           where=where(),
-                                                                           src=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def refine_or_intro(self: Any, whether: bool, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    expr = expr if expr != '' else self.srcFile
-
-    command = 'Cmd_refine_or_intro {whether} {interactionId} {where} "{src}"'.format(whether='True' if whether else 'False',
-                                                                                     interactionId=str(interactionId),
-                                                                                     where=where(),
-                                                                                     src=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
-
-  def context(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
-
-    command = 'Cmd_context {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite, interactionId=interactionId, where=where(), src=expr)
-
-    self.history.append(command)
-    return self.wrap(command)
+def range_parser_validator(r: str) -> bool:
+  return r.strip() in ['', 'noRange'] or RANGE.fullmatch(r) is not None
 
-  def helper_function(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
 
-    command = 'Cmd_helper_function {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                     interactionId=interactionId,
-                                                                                     where=where(),
-                                                                                     src=expr)
+def range_parser(f: str, r: str) -> Range:
+  """Parse `--where` arguments into a `Range` of `f`.
 
-    self.history.append(command)
-    return self.wrap(command)
+  Intervals are given as `((line₁, column₁), (line₂, column₂))` or as character offsets `(position₁, position₂)`, both
+  1-based like Agda's. Several intervals are written as a list, `[((1, 1), (1, 5)), (40, 42)]`.
+  """
+  if r.strip() in ['', 'noRange']:
+    return Range()
+  if RANGE.fullmatch(r) is None:
+    raise ValueError(f'Could not parse range {r}')
 
-  def infer(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+  lines = line_index(f)
+  intervals = []
+  for match in INTERVAL.finditer(r):
+    p1, p2, l1, c1, l2, c2 = match.groups()
+    if p1 is not None:
+      start, end = int(p1), int(p2)
+      (l1, c1), (l2, c2) = lines.position(start), lines.position(end)
+    else:
+      l1, c1, l2, c2 = int(l1), int(c1), int(l2), int(c2)
+      if not (1 <= l1 <= len(lines) and 1 <= l2 <= len(lines)):
+        raise ValueError(f'Range {match.group(0)} is outside of {f}')
+      start, end = lines.offset(l1, c1), lines.offset(l2, c2)
 
-    command = 'Cmd_infer {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite, interactionId=interactionId, where=where(), src=expr)
+    if not 1 <= start <= end <= lines.length + 1:
+      raise ValueError(f'Range {match.group(0)} is outside of {f} or ends before it starts')
+    intervals.append(Interval(Position(f, start, l1, c1), Position(f, end, l2, c2)))
 
-    self.history.append(command)
-    return self.wrap(command)
+  return Range(sorted(intervals, key=lambda i: i.start.position))
 
-  def goal_type(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
 
-    command = 'Cmd_goal_type {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite, interactionId=interactionId, where=where(), src=expr)
+class Record:
+  """A command built for Agda, when it was sent and how long Agda took to answer it.
+  """
+  __slots__ = ('kind', 'interactionId', 'args', 'sent', 'latency')
 
-    self.history.append(command)
-    return self.wrap(command)
+  def __init__(self: Any, kind: str, interactionId: Optional[int] = None, args: Tuple[Any, ...] = ()):
+    self.kind = kind
+    self.interactionId = interactionId
+    self.args = args
+    self.sent: Optional[float] = None
+    self.latency: Optional[float] = None
 
-  def elaborate_give(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+  def __repr__(self: Any) -> str:
+    return f'Record({self.kind}, {self.interactionId}, {self.latency})'
 
-    command = 'Cmd_elaborate_give {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                    interactionId=interactionId,
-                                                                                    where=where(),
-                                                                                    src=expr)
+  def json(self: Any) -> Dict[str, Any]:
+    return {'kind': self.kind, 'interactionId': self.interactionId, 'args': self.args, 'sent': self.sent, 'latency': self.latency}
 
-    self.history.append(command)
-    return self.wrap(command)
 
-  def goal_type_context(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+class CommandHistory:
+  """The last `size` commands built by a `Commands`, older ones are dropped.
 
-    command = 'Cmd_goal_type_context {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                       interactionId=interactionId,
-                                                                                       where=where(),
-                                                                                       src=expr)
+  Arguments are kept short, long expressions are cut to `ARGUMENT` characters. Sessions fill in when each command
+  was sent and its latency, `export` writes the records as JSON lines.
+  """
+  def __init__(self: Any, size: int = HISTORY):
+    assert size > 0, 'History needs room for at least one command'
+    self.records: Deque[Record] = deque(maxlen=size)
 
-    self.history.append(command)
-    return self.wrap(command)
+  def __len__(self: Any) -> int:
+    return len(self.records)
 
-  def goal_type_context_infer(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+  def __iter__(self: Any) -> Iterator[Record]:
+    return iter(self.records)
 
-    command = 'Cmd_goal_type_context_infer {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                             interactionId=interactionId,
-                                                                                             where=where(),
-                                                                                             src=expr)
+  def __getitem__(self: Any, i: int) -> Record:
+    return self.records[i]
 
-    self.history.append(command)
-    return self.wrap(command)
+  @property
+  def last(self: Any) -> Optional[Record]:
+    return self.records[-1] if len(self.records) > 0 else None
 
-  def goal_type_context_check(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+  def add(self: Any, kind: str, interactionId: Optional[int] = None, args: Tuple[Any, ...] = ()) -> Record:
+    record = Record(kind, interactionId, args if _short(args) else _shorten(args))
+    self.records.append(record)
+    return record
 
-    command = 'Cmd_goal_type_context_check {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                             interactionId=interactionId,
-                                                                                             where=where(),
-                                                                                             src=expr)
+  def export(self: Any, f: IO[str]):
+    for record in self.records:
+      f.write(json.dumps(record.json()) + '\n')
 
-    self.history.append(command)
-    return self.wrap(command)
 
-  def show_module_contents(self: Any, rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert rewrite in rewriteModes, \
-        rewrite + ' should be on of ' + ', '.join(rewriteModes)
-    expr = expr if expr != '' else self.srcFile
+def _short(args: Tuple[Any, ...]) -> bool:
+  for a in args:
+    if type(a) is not str or len(a) > ARGUMENT:
+      return False
+  return True
 
-    command = 'Cmd_show_module_contents {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
-                                                                                          interactionId=interactionId,
-                                                                                          where=where(),
-                                                                                          src=expr)
 
-    self.history.append(command)
-    return self.wrap(command)
+def _shorten(arg: Any) -> Any:
+  if type(arg) is str and len(arg) > ARGUMENT:
+    return arg[:ARGUMENT] + '…'
+  elif type(arg) is tuple:
+    return tuple([_shorten(a) for a in arg])
+  return arg
 
-  def make_case(self: Any, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    expr = expr if expr != '' else self.srcFile
 
-    command = 'Cmd_make_case {interactionId} {where} "{src}"'.format(interactionId=interactionId, where=where(), src=expr)
+class Batch:
+  """IOTCM commands built while `Commands.batch()` was open, to be written to Agda in one go.
+
+  The commands are joined into one newline-delimited `buffer` when the batch closes. Responses come back in the
+  order of `commands`, `records` are their history records.
+  """
+  def __init__(self: Any, srcFile: str):
+    self.srcFile = srcFile
+    self.commands: List[str] = []
+    self.records: List[Optional[Record]] = []
+    self.buffer = b''
 
-    self.history.append(command)
-    return self.wrap(command)
+  def __len__(self: Any) -> int:
+    return len(self.commands)
 
-  def why_in_scope(self: Any, interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    expr = expr if expr != '' else self.srcFile
+  def append(self: Any, command: str, record: Optional[Record] = None):
+    self.commands.append(command)
+    self.records.append(record)
 
-    command = 'Cmd_why_in_scope {interactionId} {where} "{src}"'.format(interactionId=interactionId, where=where(), src=expr)
+  def close(self: Any):
+    self.buffer = ''.join([c + '\n' for c in self.commands]).encode('utf-8')
 
-    self.history.append(command)
-    return self.wrap(command)
 
-  def compute(self: Any, computeMode: str = 'DefaultCompute', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
-    assert computeMode in computeModes, \
-        computeMode + ' should be on of ' + ', '.join(computeModes)
-    expr = expr if expr != '' else self.srcFile
+class Commands:
+  """Builders for the IOTCM commands of Agda's interaction protocol, one method per command in `COMMANDS`.
 
-    command = 'Cmd_compute {computeMode} {interactionId} {where} "{src}"'.format(computeMode=computeMode,
-                                                                                 interactionId=interactionId,
-                                                                                 where=where(),
-                                                                                 src=expr)
+  The methods are generated from the table below when this module is imported, with the signatures of the
+  parameters in `PARAMETERS`, e.g. `Commands(f).goal_type_context('Simplified', 0, Range(), '')`.
+  """
+  def __init__(self: Any, srcFile: str, history: int = HISTORY):
+    assert path.exists(srcFile)
 
-    self.history.append(command)
-    return self.wrap(command)
+    self.history = CommandHistory(history)
+    self._batch: Optional[Batch] = None
+    self.srcFile = srcFile
 
-  def why_in_scope_toplevel(self: Any, expr: str = '') -> str:
+  @property
+  def srcFile(self: Any) -> str:
+    return self._srcFile
 
-    command = 'Cmd_why_in_scope_toplevel "{expr}"'.format(expr=expr)
+  @srcFile.setter
+  def srcFile(self: Any, srcFile: str):
+    # The start of every command only depends on the file, build it once rather than on every call
+    self._srcFile = srcFile
+    self._local = f'IOTCM "{srcFile}" NonInteractive Indirect ('
+    self._global = f'IOTCM "{srcFile}" None Indirect ('
 
-    self.history.append(command)
-    return self.wrap(command)
+  def __get__(self: Any, command: str):
+    assert hasattr(self, command)
 
-  def show_version(self: Any) -> str:
-    command = 'Cmd_show_version'
+    method = getattr(self, command)
+    return method
 
-    self.history.append(command)
-    return self.wrap(command)
+  @contextmanager
+  def batch(self: Any) -> Iterator[Batch]:
+    """Collect the commands built inside the block, to send them with `send_batch`:
+
+      with commands.batch() as batch:
+        for i in ids:
+          commands.goal_type_context('Simplified', i, Range(), '')
+      session.send_batch(batch)
+    """
+    assert self._batch is None, 'Batches can not be nested'
+    self._batch = Batch(self.srcFile)
+    try:
+      yield self._batch
+    finally:
+      self._batch.close()
+      self._batch = None
+
+  def holes(self: Any) -> List[Hole]:
+    """The holes of the file in the order Agda numbers them, so goal commands can be built before it is loaded:
+
+      for hole in commands.holes():
+        commands.goal_type('Simplified', hole.id, hole.where, '')
+    """
+    return hole_index(self.srcFile)
 
-  def abort(self: Any) -> str:
-    command = 'Cmd_abort'
+  def wrap(self: Any, command: str):
+    return self._collect(self._local + command + ')')
 
-    self.history.append(command)
-    return self.wrap(command)
+  def wrap_global(self: Any, command: str):
+    return self._collect(self._global + command + ')')
+
+  def _collect(self: Any, iotcm: str) -> str:
+    if self._batch is not None:
+      self._batch.append(iotcm, self.history.last)
+    return iotcm
+
+
+REQUIRED = inspect.Parameter.empty
+
+# Parameters of the builders: type, default, the values allowed and how the value is written into the command
+PARAMETERS: Dict[str, Tuple[Any, Any, Optional[List[str]], str]] = {
+  'backend': (str, REQUIRED, backends, '{backend}'),
+  'rewrite': (str, 'Simplified', rewriteModes, '{rewrite}'),
+  'computeMode': (str, 'DefaultCompute', computeModes, '{computeMode}'),
+  'remove': (str, REQUIRED, removeOrKeep, '{remove}'),
+  'force': (str, REQUIRED, useForce, '{force}'),
+  'whether': (bool, REQUIRED, None, '{"True" if whether else "False"}'),
+  'interactionId': (int, 0, None, '{interactionId}'),
+  'where': (Range, Range(), None, '{where()}'),
+  'expr': (str, '', None, '"{expr}"'),
+  'cmds': (List[str], REQUIRED, None, '[{_quoted(cmds)}]'),
+  'src': (None, None, None, '"{self._srcFile}"'),
+}
+
+# name, template, whether the command is global to the file, whether an empty expression defaults to the file
+COMMANDS: List[Tuple[str, str, bool, bool]] = [
+  ('compile', 'Cmd_compile {backend} {src} {cmds}', False, False),
+  ('load', 'Cmd_load {src} {cmds}', False, False),
+  ('constraints', 'Cmd_constraints', False, False),
+  ('metas', 'Cmd_metas', False, False),
+  ('show_module_contents_toplevel', 'Cmd_show_module_contents_toplevel {rewrite} {expr}', True, False),
+  ('search_about_toplevel', 'Cmd_search_about_toplevel {rewrite} {expr}', False, False),
+  ('solveAll', 'Cmd_solveAll {rewrite}', False, False),
+  ('solveOne', 'Cmd_solveOne {rewrite} {interactionId} {where} {expr}', False, False),
+  ('autoAll', 'Cmd_autoAll', False, False),
+  ('autoOne', 'Cmd_autoOne {interactionId} {where} {expr}', False, False),
+  ('auto', 'Cmd_auto {interactionId} {where} {expr}', False, False),
+  ('infer_toplevel', 'Cmd_infer_toplevel {rewrite} {expr}', False, False),
+  ('compute_toplevel', 'Cmd_compute_toplevel {computeMode} {expr}', True, False),
+  ('load_highlighting_info', 'Cmd_load_highlighting_info {src}', False, False),
+  ('tokenHighlighting', 'Cmd_tokenHighlighting {src} {remove}', False, False),
+  ('highlight', 'Cmd_highlight {interactionId} {where} {src}', False, False),
+  ('give', 'Cmd_give {force} {interactionId} {where} {expr}', False, True),
+  ('refine', 'Cmd_refine {interactionId} {where} {expr}', False, True),
+  ('intro', 'Cmd_intro {whether} {interactionId} {where} {expr}', False, True),
+  ('refine_or_intro', 'Cmd_refine_or_intro {whether} {interactionId} {where} {expr}', False, True),
+  ('context', 'Cmd_context {rewrite} {interactionId} {where} {expr}', False, True),
+  ('helper_function', 'Cmd_helper_function {rewrite} {interactionId} {where} {expr}', False, True),
+  ('infer', 'Cmd_infer {rewrite} {interactionId} {where} {expr}', False, True),
+  ('goal_type', 'Cmd_goal_type {rewrite} {interactionId} {where} {expr}', False, True),
+  ('elaborate_give', 'Cmd_elaborate_give {rewrite} {interactionId} {where} {expr}', False, True),
+  ('goal_type_context', 'Cmd_goal_type_context {rewrite} {interactionId} {where} {expr}', False, True),
+  ('goal_type_context_infer', 'Cmd_goal_type_context_infer {rewrite} {interactionId} {where} {expr}', False, True),
+  ('goal_type_context_check', 'Cmd_goal_type_context_check {rewrite} {interactionId} {where} {expr}', False, True),
+  ('show_module_contents', 'Cmd_show_module_contents {rewrite} {interactionId} {where} {expr}', False, True),
+  ('make_case', 'Cmd_make_case {interactionId} {where} {expr}', False, True),
+  ('why_in_scope', 'Cmd_why_in_scope {interactionId} {where} {expr}', False, True),
+  ('compute', 'Cmd_compute {computeMode} {interactionId} {where} {expr}', False, True),
+  ('why_in_scope_toplevel', 'Cmd_why_in_scope_toplevel {expr}', False, False),
+  ('show_version', 'Cmd_show_version', False, False),
+  ('abort', 'Cmd_abort', False, False),
+]
+
+interactions: List[str] = [name for name, _, _, _ in COMMANDS]
+
+
+def _quoted(cmds: List[str]) -> str:
+  return ','.join(['"' + c + '"' for c in cmds])
+
+
+def _generate(name: str, template: str, toplevel: bool, fallback: bool) -> Callable[..., str]:
+  # Like dataclasses, compile each builder from source, so that a call does no more than check and concatenate
+  kind, *fields = template.split(' ')
+  parameters = [f[1:-1] for f in fields if f != '{src}']
+  namespace: Dict[str, Any] = {'_quoted': _quoted}
+
+  signature = ['self']
+  lines = []
+  for p in parameters:
+    annotation, default, allowed, _ = PARAMETERS[p]
+    namespace.update({f'_{p}_type': annotation, f'_{p}_default': default})
+    signature.append(f'{p}: _{p}_type' + (f' = _{p}_default' if default is not REQUIRED else ''))
+    if allowed is not None:
+      namespace.update({f'_{p}_allowed': frozenset(allowed), f'_{p}_error': ' should be on of ' + ', '.join(allowed)})
+      lines.append(f'assert {p} in _{p}_allowed, {p} + _{p}_error')
+  if fallback:
+    lines.append("expr = expr if expr != '' else self._srcFile")
+
+  recorded = [f'tuple({p})' if p == 'cmds' else p for p in parameters if p not in ['interactionId', 'where']]
+  interactionId = 'interactionId' if 'interactionId' in parameters else 'None'
+  lines.append(f"self.history.add('{kind}', {interactionId}, ({''.join([r + ', ' for r in recorded])}))")
+
+  command = ' '.join([kind] + [PARAMETERS[f[1:-1]][3] for f in fields])
+  lines.append(f"return self._collect(f'{{self.{'_global' if toplevel else '_local'}}}{command})')")
+
+  exec(f"def {name}({', '.join(signature)}) -> str:\n" + ''.join([f'  {line}\n' for line in lines]), namespace)
+  builder = namespace[name]
+  builder.__qualname__ = f'Commands.{name}'
+  builder.__module__ = __name__
+  return builder
+
+
+for _command in COMMANDS:
+  setattr(Commands, _command[0], _generate(*_command))
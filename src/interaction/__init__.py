@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from .cache import *
+from .highlighting import *
+from .pool import *
+from .responses import *
+from .session import *
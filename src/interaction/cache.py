@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import re
+from os import path
+from typing import *
+
+from config import ROOT
+from interaction.responses import HighlightingInfo, Response, RunningInfo, parse_response
+from source import closure_hash, include_root, library_includes
+from util import agda_version
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+QUERIES = path.join(ROOT, 'queries')
+LIMIT = 64 << 20
+
+# Queries whose answers only depend on the loaded modules and the query itself
+CACHEABLE = ['infer_toplevel', 'compute_toplevel', 'show_module_contents_toplevel', 'search_about_toplevel', 'why_in_scope_toplevel']
+
+QUERY = re.compile(r'^IOTCM "(?:[^"\\]|\\.)*" \w+ \w+ \((.*)\)\s*$', re.DOTALL)
+
+
+class QueryCache:
+  """Responses to pure queries, stored as JSON under `~/.refl/queries`.
+
+  Entries are keyed by the sources of the loaded file's import closure, the Agda version, the flags and the command
+  without the file's path. Imports are looked up like Agda does: from the root of the file's module hierarchy, the
+  include paths and libraries in the flags, and the file's own library. The closure is hashed once per `load`. Hits
+  refresh an entry's modification time, and once more than `limit` bytes are stored the least recently used entries
+  are removed.
+  """
+  def __init__(self: Any, root: str = QUERIES, limit: int = LIMIT, agda: str = 'agda', includes: List[str] = [], flags: List[str] = []):
+    self.root = root
+    self.limit = limit
+    self.agda = agda
+    self.includes = [path.abspath(i) for i in includes]
+    self.flags = flags
+    self.scopes: Dict[str, str] = {}
+    self.hits = 0
+    self.misses = 0
+    self._size: Optional[int] = None
+
+  def load(self: Any, srcFile: str, cmds: List[str] = []):
+    """Hash the sources answers about `srcFile` depend on, every time Agda loads it with the options `cmds`.
+    """
+    flags = self.flags + cmds
+    includes = [include_root(srcFile)] + self.includes + include_paths(flags) + library_includes(srcFile, library_names(flags))
+    h = hashlib.sha256(f'{agda_version(self.agda)}:{" ".join(flags)}:{closure_hash(srcFile, includes)}'.encode('utf-8'))
+    self.scopes[path.abspath(srcFile)] = h.hexdigest()
+
+  def key(self: Any, srcFile: str, command: str) -> str:
+    match = QUERY.match(command)
+    assert match is not None, 'Not an IOTCM command: ' + command
+    scope = self.scopes.get(path.abspath(srcFile))
+    assert scope is not None, f'{srcFile} was not loaded'
+
+    h = hashlib.sha256(scope.encode('utf-8'))
+    h.update(match.group(1).strip().encode('utf-8'))
+    return h.hexdigest()
+
+  def get(self: Any, key: str) -> Optional[List[Response]]:
+    entry = self._entry(key)
+    try:
+      with open(entry, encoding='utf-8') as f:
+        responses = [parse_response(r) for r in json.load(f)]
+      os.utime(entry)
+    except (OSError, ValueError) as e:
+      self.misses += 1
+      return None
+    self.hits += 1
+    return responses
+
+  def put(self: Any, key: str, responses: List[Response]):
+    entry = self._entry(key)
+    os.makedirs(path.dirname(entry), exist_ok=True)
+    data = json.dumps([r.data for r in responses if not isinstance(r, (HighlightingInfo, RunningInfo))], ensure_ascii=False)
+
+    # Written aside and renamed, so that concurrent jobs never read half an entry
+    with open(entry + '.tmp', 'w', encoding='utf-8') as f:
+      f.write(data)
+    replaced = path.getsize(entry) if path.exists(entry) else 0
+    os.replace(entry + '.tmp', entry)
+
+    self._size = (self._size if self._size is not None else self.size()) + path.getsize(entry) - replaced
+    if self._size > self.limit:
+      self.evict()
+
+  def size(self: Any) -> int:
+    return sum([size for _, size, _ in self._entries()])
+
+  def evict(self: Any):
+    # Down to three quarters of the limit, so that not every later `put` has to evict again
+    entries = sorted(self._entries())
+    total = sum([size for _, size, _ in entries])
+    for _, size, entry in entries:
+      if total <= self.limit * 3 // 4:
+        break
+      try:
+        os.remove(entry)
+        total -= size
+      except OSError as e:
+        log.debug(f'Could not remove cached query {entry}: {e}')
+    self._size = total
+
+  def _entry(self: Any, key: str) -> str:
+    return path.join(self.root, key[:2], key + '.json')
+
+  def _entries(self: Any) -> List[Tuple[float, int, str]]:
+    entries = []
+    if not path.exists(self.root):
+      return entries
+    for directory in os.scandir(self.root):
+      if directory.is_dir():
+        for entry in os.scandir(directory.path):
+          if entry.name.endswith('.json'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _option(flags: List[str], short: str, long: str) -> List[str]:
+  # Values of an option given as `-iX`, `-i X`, `--include-path X` or `--include-path=X`
+  values = []
+  for i, flag in enumerate(flags):
+    if flag in [short, long] and i + 1 < len(flags):
+      values.append(flags[i + 1])
+    elif flag.startswith(long + '='):
+      values.append(flag[len(long) + 1:])
+    elif flag.startswith(short) and len(flag) > len(short) and not flag.startswith('--'):
+      values.append(flag[len(short):])
+  return values
+
+
+def include_paths(flags: List[str]) -> List[str]:
+  return [path.abspath(i) for i in _option(flags, '-i', '--include-path')]
+
+
+def library_names(flags: List[str]) -> List[str]:
+  return _option(flags, '-l', '--library')
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import json
+import re
+from array import array
+from typing import *
+
+from interaction.responses import ClearHighlighting, HighlightingInfo, Response
+
+SPACE = re.compile(r'\s*')
+DECODER = json.JSONDecoder()
+
+
+class Highlighting:
+  """The highlighting of a file in columns, one row per range, instead of one dict per range as Agda sends it.
+
+  Offsets are Agda's 1-based positions, `ends` are exclusive. The atoms of a range (`keyword`, `function`, ...) are
+  interned as one id per distinct combination, definition sites as one id per distinct site with 0 for none. Rows
+  are sorted by start when first looked up, lookups bisect the starts and the furthest end of the rows up to each. `tokens` marks the ranges Agda found from the
+  tokens alone, which a later response with `remove` or a token-based `ClearHighlighting` replaces.
+
+  Highlighting written to a file (`Indirect`, as `Commands` asks for) is decoded one range at a time, so only one
+  dict is alive at any point. Direct responses arrive already decoded by `ResponseDecoder`, for those only the
+  memory kept afterwards shrinks.
+  """
+  __slots__ = ('starts', 'ends', 'aspects', 'definitions', 'tokens', 'kinds', 'sites', '_kinds', '_sites', '_reach', '_sorted')
+
+  def __init__(self: Any):
+    self.starts = array('I')
+    self.ends = array('I')
+    self.aspects = array('I')
+    self.definitions = array('I')
+    self.tokens = array('B')
+    self.kinds: List[Tuple[str, ...]] = []
+    self.sites: List[Optional[Tuple[str, int]]] = [None]
+    self._kinds: Dict[Tuple[str, ...], int] = {}
+    self._sites: Dict[Tuple[str, int], int] = {}
+    self._reach = array('I')
+    self._sorted = True
+
+  def __len__(self: Any) -> int:
+    return len(self.starts)
+
+  @staticmethod
+  def of(responses: Iterable[Response]) -> 'Highlighting':
+    highlighting = Highlighting()
+    for response in responses:
+      if isinstance(response, (HighlightingInfo, ClearHighlighting)):
+        highlighting.add(response)
+    return highlighting
+
+  def add(self: Any, response: Union[HighlightingInfo, ClearHighlighting]):
+    if isinstance(response, ClearHighlighting):
+      self.clear(response.tokenBased)
+      return
+
+    if response.filepath is None:
+      if response.remove:
+        self.clear(tokenBased=True)
+      for item in response.payload:
+        self.extend(item)
+      return
+
+    # Indirect highlighting, Agda wrote the info to a file, where most of it ends up for large files
+    with open(response.filepath, encoding='utf-8') as f:
+      text = f.read()
+    # Agda writes `remove` before the payload
+    for key, value in _fields(text):
+      if key == 'remove' and value:
+        self.clear(tokenBased=True)
+      elif key == 'payload':
+        self.extend(value)
+
+  def extend(self: Any, item: Dict[str, Any]):
+    atoms = tuple(item.get('atoms', []))
+    kind = self._kinds.get(atoms)
+    if kind is None:
+      kind = self._kinds[atoms] = len(self.kinds)
+      self.kinds.append(atoms)
+
+    site = 0
+    definition = item.get('definitionSite')
+    if definition is not None:
+      key = (definition.get('filepath', ''), definition.get('position', 0))
+      site = self._sites.get(key, 0)
+      if site == 0:
+        site = self._sites[key] = len(self.sites)
+        self.sites.append(key)
+
+    token = item.get('tokenBased') == 'TokenBased'
+    for start, end in item.get('range', []):
+      if len(self.starts) > 0 and start < self.starts[-1]:
+        self._sorted = False
+      self.starts.append(start)
+      self.ends.append(end)
+      self.aspects.append(kind)
+      self.definitions.append(site)
+      self.tokens.append(token)
+
+  def clear(self: Any, tokenBased: bool = False):
+    """Drop all ranges, or only the token-based ones.
+    """
+    if not tokenBased:
+      for column in self._columns():
+        del column[:]
+      del self._reach[:]
+      self._sorted = True
+      return
+
+    keep = [k for k in range(len(self.tokens)) if not self.tokens[k]]
+    for column in self._columns():
+      column[:] = array(column.typecode, [column[k] for k in keep])
+    del self._reach[:]
+
+  def at(self: Any, offset: int) -> List[Tuple[int, int, Tuple[str, ...], Optional[Tuple[str, int]]]]:
+    """Ranges containing `offset`, as start, end, atoms and definition site.
+    """
+    return self.within(offset, offset + 1)
+
+  def within(self: Any, start: int, end: int) -> List[Tuple[int, int, Tuple[str, ...], Optional[Tuple[str, int]]]]:
+    """Ranges overlapping `start` up to `end`, ordered by start.
+    """
+    self._index()
+    # Rows before the first one whose reach passes `start` all end before it
+    i = bisect.bisect_right(self._reach, start)
+    j = bisect.bisect_left(self.starts, end)
+    return [(self.starts[k], self.ends[k], self.kinds[self.aspects[k]], self.sites[self.definitions[k]]) for k in range(i, j) if self.ends[k] > start]
+
+  def _index(self: Any):
+    if not self._sorted:
+      order = sorted(range(len(self.starts)), key=self.starts.__getitem__)
+      for column in self._columns():
+        column[:] = array(column.typecode, [column[k] for k in order])
+      del self._reach[:]
+      self._sorted = True
+
+    # The furthest end of the rows up to each, only the rows appended since the last lookup are added
+    reach = self._reach[-1] if len(self._reach) > 0 else 0
+    for k in range(len(self._reach), len(self.ends)):
+      reach = max(reach, self.ends[k])
+      self._reach.append(reach)
+
+  def _columns(self: Any) -> List[array]:
+    return [self.starts, self.ends, self.aspects, self.definitions, self.tokens]
+
+
+def _fields(text: str) -> Iterator[Tuple[str, Any]]:
+  # Keys and values of a JSON object in order, a `payload` array item by item, so it is never decoded as a whole
+  position = _skip(text, 0, '{')
+  while not text.startswith('}', position):
+    key, position = DECODER.raw_decode(text, position)
+    position = _skip(text, position, ':')
+    if key == 'payload' and text.startswith('[', position):
+      position = _skip(text, position, '[')
+      while not text.startswith(']', position):
+        item, position = DECODER.raw_decode(text, position)
+        yield key, item
+        position = _skip(text, position, ',', ']')
+      position += 1
+    else:
+      value, position = DECODER.raw_decode(text, position)
+      yield key, value
+    position = _skip(text, position, ',', '}')
+
+
+def _skip(text: str, position: int, separator: str, end: Optional[str] = None) -> int:
+  # Past the whitespace around `separator`, or up to `end`
+  position = SPACE.match(text, position).end()
+  if end is not None and text.startswith(end, position):
+    return position
+  if not text.startswith(separator, position):
+    raise ValueError(f'Expecting {separator!r} at {position} of the highlighting')
+  return SPACE.match(text, position + 1).end()
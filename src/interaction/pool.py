@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from collections import OrderedDict
+from os import path
+from typing import *
+
+from interaction.responses import Response
+from commands import Batch
+from interaction.session import Session
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+IOTCM = re.compile(r'^IOTCM "((?:[^"\\]|\\.)*)"')
+
+
+def rss(pid: int) -> int:
+  # Resident memory of a process in bytes, 0 where /proc is not available
+  try:
+    with open(f'/proc/{pid}/statm') as statm:
+      return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except Exception as e:
+    return 0
+
+
+class SessionPool:
+  """Warm Agda sessions, one per loaded top-level file and set of flags.
+
+  Requests are routed to the session which already has their `srcFile` loaded. When more than `size` sessions are
+  alive, or their resident memory exceeds `memory` bytes, the least recently used ones are closed.
+  """
+  def __init__(self: Any, size: int = 4, memory: Optional[int] = None, agda: str = 'agda', flags: List[str] = [], cwd: Optional[str] = None):
+    assert size > 0, 'Pool needs room for at least one session'
+
+    self.size = size
+    self.memory = memory
+    self.agda = agda
+    self.flags = flags
+    self.cwd = cwd
+
+    self.sessions: 'OrderedDict[Tuple[str, Tuple[str, ...]], Session]' = OrderedDict()
+    self.mtimes: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+    self.hits = 0
+    self.misses = 0
+
+  def __enter__(self: Any) -> 'SessionPool':
+    return self
+
+  def __exit__(self: Any, *args):
+    self.close()
+
+  def __len__(self: Any) -> int:
+    return len(self.sessions)
+
+  def session(self: Any, srcFile: str, flags: Optional[List[str]] = None, load: bool = True) -> Session:
+    flags = self.flags if flags is None else flags
+    key = (self._path(srcFile), tuple(flags))
+    session = self.sessions.get(key)
+
+    if session is not None and session.alive():
+      self.sessions.move_to_end(key)
+      self.hits += 1
+    else:
+      self.misses += 1
+      session = Session(key[0], self.agda, flags, self.cwd).start()
+      self.sessions[key] = session
+
+    # A warm session only has to reload when the file changed since it was last loaded
+    if load and (session.loaded is None or self.mtimes.get(key) != self._mtime(key[0])):
+      session.load([])
+      self.mtimes[key] = self._mtime(key[0])
+    # Loading is what takes memory, so the budget is checked afterwards
+    self._evict()
+    return session
+
+  def send(self: Any, command: str, flags: Optional[List[str]] = None) -> List[Response]:
+    match = IOTCM.match(command)
+    assert match is not None, 'Not an IOTCM command: ' + command
+
+    srcFile = match.group(1)
+    loads = 'Cmd_load ' in command
+    session = self.session(srcFile, flags, load=not loads)
+    responses = session.send(command)
+
+    if loads:
+      key = (self._path(srcFile), tuple(self.flags if flags is None else flags))
+      session.loaded = srcFile
+      self.mtimes[key] = self._mtime(key[0])
+      self._evict()
+    return responses
+
+  def send_batch(self: Any, batch: Batch, flags: Optional[List[str]] = None) -> List[List[Response]]:
+    return self.session(batch.srcFile, flags).send_batch(batch)
+
+  def close(self: Any):
+    for session in self.sessions.values():
+      session.close()
+    self.sessions.clear()
+    self.mtimes.clear()
+
+  def memory_usage(self: Any) -> int:
+    return sum([rss(s.process.pid) for s in self.sessions.values() if s.alive()])
+
+  def _evict(self: Any):
+    # The session used last is at the end and never evicted, it stays even if it alone exceeds the budget
+    while len(self.sessions) > 1 and (len(self.sessions) > self.size or (self.memory is not None and self.memory_usage() > self.memory)):
+      key, session = self.sessions.popitem(last=False)
+      log.debug(f'Evicting Agda session for {key[0]}')
+      self.mtimes.pop(key, None)
+      session.close()
+
+  def _path(self: Any, srcFile: str) -> str:
+    return path.abspath(path.join(self.cwd, srcFile) if self.cwd is not None else srcFile)
+
+  @staticmethod
+  def _mtime(srcFile: str) -> float:
+    try:
+      return os.stat(srcFile).st_mtime
+    except OSError as e:
+      return 0.0
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from typing import *
+from typing import IO
+
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+PROMPT = b'JSON> '
+CHUNK = 65536
+
+
+class Prompt:
+  """Agda printed `JSON> `, i.e. it is done with the previous command and waits for the next one.
+  """
+  __slots__ = ()
+
+  def __repr__(self: Any) -> str:
+    return 'Prompt()'
+
+
+PROMPTED = Prompt()
+
+
+class Response:
+  __slots__ = ('kind', 'data')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    self.kind: str = data.get('kind', '')
+    self.data = data
+
+  def __repr__(self: Any) -> str:
+    return f'{type(self).__name__}({self.kind})'
+
+  def __str__(self: Any) -> str:
+    return ''
+
+
+class Status(Response):
+  __slots__ = ('checked', 'showImplicitArguments', 'showIrrelevantArguments')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(Status, self).__init__(data)
+    status = data.get('status', {})
+    self.checked: bool = status.get('checked', False)
+    self.showImplicitArguments: bool = status.get('showImplicitArguments', False)
+    self.showIrrelevantArguments: bool = status.get('showIrrelevantArguments', False)
+
+
+class HighlightingInfo(Response):
+  __slots__ = ('direct', 'remove', 'payload', 'filepath')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(HighlightingInfo, self).__init__(data)
+    info = data.get('info', {})
+    self.direct: bool = data.get('direct', True)
+    self.remove: bool = info.get('remove', False)
+    self.payload: List[Dict[str, Any]] = info.get('payload', [])
+    # Indirect highlighting is written to a temporary file instead
+    self.filepath: Optional[str] = data.get('filepath')
+
+
+class ClearHighlighting(Response):
+  __slots__ = ('tokenBased', )
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(ClearHighlighting, self).__init__(data)
+    # Only the token-based highlighting is dropped, or all of it
+    self.tokenBased: bool = data.get('tokenBased', 'NotOnlyTokenBased') == 'TokenBased'
+
+
+class InteractionPoints(Response):
+  __slots__ = ('interactionPoints', )
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(InteractionPoints, self).__init__(data)
+    self.interactionPoints: List[Any] = data.get('interactionPoints', [])
+
+  @property
+  def ids(self: Any) -> List[int]:
+    # Older versions of Agda send plain ids, newer ones objects with an id and a range
+    return [p['id'] if type(p) is dict else p for p in self.interactionPoints]
+
+
+class RunningInfo(Response):
+  __slots__ = ('debugLevel', 'message')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(RunningInfo, self).__init__(data)
+    self.debugLevel: int = data.get('debugLevel', 1)
+    self.message: str = data.get('message', '')
+
+  def __str__(self: Any) -> str:
+    return self.message.rstrip()
+
+
+class JumpToError(Response):
+  __slots__ = ('filepath', 'position')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(JumpToError, self).__init__(data)
+    self.filepath: str = data.get('filepath', '')
+    self.position: int = data.get('position', 0)
+
+
+class GiveAction(Response):
+  __slots__ = ('interactionPoint', 'giveResult')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(GiveAction, self).__init__(data)
+    self.interactionPoint: Any = data.get('interactionPoint')
+    self.giveResult: Dict[str, Any] = data.get('giveResult', {})
+
+  def __str__(self: Any) -> str:
+    return str(self.giveResult.get('str', ''))
+
+
+class MakeCase(Response):
+  __slots__ = ('interactionPoint', 'variant', 'clauses')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(MakeCase, self).__init__(data)
+    self.interactionPoint: Any = data.get('interactionPoint')
+    self.variant: str = data.get('variant', '')
+    self.clauses: List[str] = data.get('clauses', [])
+
+  def __str__(self: Any) -> str:
+    return '\n'.join(self.clauses)
+
+
+class SolveAll(Response):
+  __slots__ = ('solutions', )
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(SolveAll, self).__init__(data)
+    self.solutions: List[Dict[str, Any]] = data.get('solutions', [])
+
+  def __str__(self: Any) -> str:
+    return '\n'.join([f'?{s.get("interactionPoint")} := {s.get("expression")}' for s in self.solutions])
+
+
+class DisplayInfo(Response):
+  __slots__ = ('infoKind', 'info')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(DisplayInfo, self).__init__(data)
+    self.info: Dict[str, Any] = data.get('info', {})
+    self.infoKind: str = self.info.get('kind', '')
+
+  def __repr__(self: Any) -> str:
+    return f'{type(self).__name__}({self.infoKind})'
+
+  def __str__(self: Any) -> str:
+    info = self.info
+    if 'expr' in info:
+      return info['expr']
+    elif 'version' in info:
+      return info['version']
+    elif 'contents' in info:
+      return '\n'.join([f'{c.get("name")} : {c.get("term")}' for c in info['contents']])
+    elif 'message' in info:
+      return info['message']
+    return ''
+
+
+class GoalsDisplay(DisplayInfo):
+  __slots__ = ('visibleGoals', 'invisibleGoals', 'warnings', 'errors')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(GoalsDisplay, self).__init__(data)
+    self.visibleGoals: List[Dict[str, Any]] = self.info.get('visibleGoals', [])
+    self.invisibleGoals: List[Dict[str, Any]] = self.info.get('invisibleGoals', [])
+    self.warnings: List[Any] = self.info.get('warnings', [])
+    self.errors: List[Any] = self.info.get('errors', [])
+
+  def __str__(self: Any) -> str:
+    goals = [f'?{g.get("constraintObj", {}).get("id", g.get("constraintObj"))} : {g.get("type")}' for g in self.visibleGoals]
+    return '\n'.join(goals + [_message(w) for w in self.warnings + self.errors])
+
+
+class GoalSpecific(DisplayInfo):
+  __slots__ = ('interactionPoint', 'goalInfo')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(GoalSpecific, self).__init__(data)
+    self.interactionPoint: Any = self.info.get('interactionPoint')
+    self.goalInfo: Dict[str, Any] = self.info.get('goalInfo', {})
+
+  def __str__(self: Any) -> str:
+    lines = [f'{e.get("originalName", e.get("reifiedName"))} : {e.get("binding")}' for e in self.goalInfo.get('entries', [])]
+    if 'type' in self.goalInfo:
+      lines = [f'Goal: {self.goalInfo["type"]}'] + lines
+    if 'expr' in self.goalInfo:
+      lines.append(f'Have: {self.goalInfo["expr"]}')
+    return '\n'.join(lines)
+
+
+class Error(DisplayInfo):
+  __slots__ = ('message', 'warnings')
+
+  def __init__(self: Any, data: Dict[str, Any]):
+    super(Error, self).__init__(data)
+    # Agda >= 2.6.2 nests the message in an error object
+    self.message: str = _message(self.info.get('error', self.info))
+    self.warnings: List[Any] = self.info.get('warnings', [])
+
+  def __str__(self: Any) -> str:
+    return self.message
+
+
+def _message(x: Any) -> str:
+  return x.get('message', '') if type(x) is dict else str(x)
+
+
+RESPONSES: Dict[str, Type[Response]] = {
+  'Status': Status,
+  'HighlightingInfo': HighlightingInfo,
+  'ClearHighlighting': ClearHighlighting,
+  'InteractionPoints': InteractionPoints,
+  'RunningInfo': RunningInfo,
+  'JumpToError': JumpToError,
+  'GiveAction': GiveAction,
+  'MakeCase': MakeCase,
+  'SolveAll': SolveAll,
+  'DisplayInfo': DisplayInfo,
+}
+
+DISPLAY_INFOS: Dict[str, Type[DisplayInfo]] = {
+  'AllGoalsWarnings': GoalsDisplay,
+  'GoalSpecific': GoalSpecific,
+  'Error': Error,
+}
+
+
+def parse_response(data: Dict[str, Any]) -> Response:
+  kind = data.get('kind', '')
+  if kind == 'DisplayInfo':
+    return DISPLAY_INFOS.get(data.get('info', {}).get('kind', ''), DisplayInfo)(data)
+  return RESPONSES.get(kind, Response)(data)
+
+
+class ResponseDecoder:
+  """Incrementally splits Agda's stdout into typed responses and prompts.
+
+  Bytes are fed as they arrive. Only the current, unfinished line is retained, as a list of chunks which is joined
+  once when its newline arrives, so a megabyte-long highlighting response is parsed exactly once.
+  """
+  def __init__(self: Any, prompt: bytes = PROMPT):
+    self.prompt = prompt
+    self._chunks: List[bytes] = []
+
+  def feed(self: Any, data: bytes) -> List[Union[Response, Prompt]]:
+    events: List[Union[Response, Prompt]] = []
+    start = 0
+
+    while True:
+      end = data.find(b'\n', start)
+      if end == -1:
+        break
+      self._chunks.append(data[start:end])
+      line = b''.join(self._chunks)
+      self._chunks = []
+      events += self._line(line)
+      start = end + 1
+
+    if start < len(data):
+      self._chunks.append(data[start:])
+      # The prompt is not followed by a newline, detect it as soon as it is complete
+      events += self._prompts()
+    return events
+
+  def _prompts(self: Any) -> List[Prompt]:
+    prompts = []
+    while len(self._chunks) > 0:
+      head = self._chunks[0]
+      if len(head) < len(self.prompt) and len(self._chunks) > 1:
+        self._chunks[0:2] = [head + self._chunks[1]]
+      elif head.startswith(self.prompt):
+        prompts.append(PROMPTED)
+        head = head[len(self.prompt):]
+        self._chunks = ([head] if head != b'' else []) + self._chunks[1:]
+      else:
+        break
+    return prompts
+
+  def _line(self: Any, line: bytes) -> List[Union[Response, Prompt]]:
+    events: List[Union[Response, Prompt]] = []
+    while line.startswith(self.prompt):
+      events.append(PROMPTED)
+      line = line[len(self.prompt):]
+
+    if line.strip() != b'':
+      try:
+        events.append(parse_response(json.loads(line)))
+      except ValueError as e:
+        log.warning(f'Could not parse Agda output: {line[:200]!r}')
+    return events
+
+
+def decode(stream: IO[bytes], chunk: int = CHUNK) -> Iterator[Union[Response, Prompt]]:
+  decoder = ResponseDecoder()
+  while True:
+    data = stream.read(chunk)
+    if not data:
+      return
+    yield from decoder.feed(data)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import *
+
+from commands import Batch, Commands, Record, interactions
+from interaction.responses import CHUNK, Prompt, Response, ResponseDecoder
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+
+class SessionError(Exception):
+  pass
+
+
+class Interaction(ABC):
+  def __init__(self: Any, srcFile: Optional[str] = None, agda: str = 'agda', flags: List[str] = [], cwd: Optional[str] = None):
+    self.commands = Commands(srcFile) if srcFile is not None else None
+    self.agda = agda
+    self.flags = flags
+    self.cwd = cwd
+    self.loaded: Optional[str] = None
+
+  def __getattr__(self: Any, name: str):
+    # Aborting gets no responses of its own, only sessions which can run commands in the background offer it
+    commands = self.__dict__.get('commands')
+    if commands is None or name not in interactions or name == 'abort':
+      raise AttributeError(name)
+
+    builder = getattr(commands, name)
+    return lambda *args, **kwargs: self.send(builder(*args, **kwargs), commands.history.last)
+
+  @abstractmethod
+  def send(self: Any, command: str, record: Optional[Record] = None) -> Any:
+    pass
+
+  @abstractmethod
+  def send_batch(self: Any, batch: Batch) -> Any:
+    pass
+
+  @abstractmethod
+  def _write(self: Any, command: str):
+    pass
+
+  def load(self: Any, cmds: List[str] = []) -> Any:
+    assert self.commands is not None, 'Session was started without a source file'
+
+    responses = self.send(self.commands.load(cmds), self.commands.history.last)
+    self.loaded = self.commands.srcFile
+    return responses
+
+
+class Session(Interaction):
+  """A long-lived `agda --interaction-json` process.
+
+  IOTCM strings built by `Commands` are written to Agda's stdin, and the responses Agda emits until it prompts
+  for the next command are returned. Builder methods of `Commands` can be called on the session directly:
+
+    with Session('test.agda') as s:
+      s.load([])
+      s.goal_type_context('Simplified', 0, Range(), '')
+  """
+  def __init__(self: Any, srcFile: Optional[str] = None, agda: str = 'agda', flags: List[str] = [], cwd: Optional[str] = None):
+    super(Session, self).__init__(srcFile, agda, flags, cwd)
+    self.process: Optional[subprocess.Popen] = None
+    self._decoder = ResponseDecoder()
+    # Output already read which belongs to the next commands of a batch
+    self._events: Deque[Union[Response, Prompt]] = deque()
+
+  def __enter__(self: Any) -> 'Session':
+    return self.start()
+
+  def __exit__(self: Any, *args):
+    self.close()
+
+  def alive(self: Any) -> bool:
+    return self.process is not None and self.process.poll() is None
+
+  def start(self: Any) -> 'Session':
+    if self.alive():
+      return self
+
+    log.debug(f'Starting {self.agda} --interaction-json {" ".join(self.flags)}')
+    self.process = subprocess.Popen([self.agda, '--interaction-json'] + self.flags,
+                                    stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    cwd=self.cwd,
+                                    bufsize=0)
+    self.loaded = None
+    self._decoder = ResponseDecoder()
+    self._events = deque()
+
+    # Agda prompts once before accepting its first command
+    self._read()
+    return self
+
+  def close(self: Any):
+    if self.process is None:
+      return
+    try:
+      self.process.stdin.close()
+      self.process.wait(timeout=5)
+    except Exception as e:
+      self.process.kill()
+    self.process = None
+    self.loaded = None
+
+  def send(self: Any, command: str, record: Optional[Record] = None) -> List[Response]:
+    self.start()
+    started = time.perf_counter()
+    if record is not None:
+      record.sent = time.time()
+    self._write(command)
+    responses = self._read()
+
+    if record is not None:
+      record.latency = time.perf_counter() - started
+    return responses
+
+  def send_batch(self: Any, batch: Batch) -> List[List[Response]]:
+    self.start()
+    started = time.perf_counter()
+    for record in batch.records:
+      if record is not None:
+        record.sent = time.time()
+
+    # Agda answers while the batch is still being written, write from another thread so that neither side blocks on a full pipe
+    writer = threading.Thread(target=self._write_all, args=(batch.buffer, ))
+    writer.start()
+    results = []
+    try:
+      for record in batch.records:
+        results.append(self._read())
+        if record is not None:
+          record.latency = time.perf_counter() - started
+    finally:
+      writer.join()
+    return results
+
+  def _write(self: Any, command: str):
+    self._write_all((command + '\n').encode('utf-8'))
+
+  def _write_all(self: Any, data: bytes):
+    # stdin is unbuffered, a single write to a pipe may take only part of the data
+    view = memoryview(data)
+    while len(view) > 0:
+      view = view[self.process.stdin.write(view):]
+
+  def _read(self: Any) -> List[Response]:
+    responses = []
+    fd = self.process.stdout.fileno()
+
+    while True:
+      while len(self._events) > 0:
+        event = self._events.popleft()
+        if isinstance(event, Prompt):
+          return responses
+        responses.append(event)
+
+      data = os.read(fd, CHUNK)
+      if data == b'':
+        raise SessionError(f'Agda exited with code {self.process.wait()}')
+      self._events.extend(self._decoder.feed(data))
+
+
+class AgdaSession(Interaction):
+  """An asyncio client for `agda --interaction-json`.
+
+  `send` writes a command and returns a future resolving to that command's responses once Agda prompts again,
+  so several requests can be queued without waiting on each round trip:
+
+    async with AgdaSession('test.agda') as s:
+      load = s.load([])
+      goals = [s.goal_type_context('Simplified', i, Range(), '') for i in range(3)]
+      await asyncio.gather(load, *goals)
+  """
+  def __init__(self: Any, srcFile: Optional[str] = None, agda: str = 'agda', flags: List[str] = [], cwd: Optional[str] = None):
+    super(AgdaSession, self).__init__(srcFile, agda, flags, cwd)
+    self.process: Optional[asyncio.subprocess.Process] = None
+    self._decoder = ResponseDecoder()
+    # Futures of the commands written so far, with the responses collected for the oldest one and their history records
+    self._pending: Deque[Tuple[asyncio.Future, List[Response], Optional[Record], float]] = deque()
+    self._reader: Optional[asyncio.Task] = None
+
+  async def __aenter__(self: Any) -> 'AgdaSession':
+    return await self.start()
+
+  async def __aexit__(self: Any, *args):
+    await self.close()
+
+  def alive(self: Any) -> bool:
+    return self.process is not None and self.process.returncode is None
+
+  async def start(self: Any) -> 'AgdaSession':
+    if self.alive():
+      return self
+
+    log.debug(f'Starting {self.agda} --interaction-json {" ".join(self.flags)}')
+    self.process = await asyncio.create_subprocess_exec(self.agda,
+                                                        '--interaction-json',
+                                                        *self.flags,
+                                                        stdin=asyncio.subprocess.PIPE,
+                                                        stdout=asyncio.subprocess.PIPE,
+                                                        cwd=self.cwd)
+    self.loaded = None
+    self._decoder = ResponseDecoder()
+
+    # Agda prompts once before accepting its first command, wait for it like for any other response
+    ready = asyncio.get_running_loop().create_future()
+    self._pending = deque([(ready, [], None, time.perf_counter())])
+    self._reader = asyncio.create_task(self._read())
+    await ready
+    return self
+
+  async def close(self: Any):
+    if self.process is None:
+      return
+    try:
+      self.process.stdin.close()
+      await asyncio.wait_for(self.process.wait(), timeout=5)
+    except Exception as e:
+      self.process.kill()
+    if self._reader is not None:
+      await asyncio.gather(self._reader, return_exceptions=True)
+    self.process = None
+    self.loaded = None
+
+  def send(self: Any, command: str, record: Optional[Record] = None) -> 'asyncio.Future[List[Response]]':
+    assert self.alive(), 'AgdaSession is not started'
+
+    future = asyncio.get_running_loop().create_future()
+    if record is not None:
+      record.sent = time.time()
+    self._pending.append((future, [], record, time.perf_counter()))
+    self._write(command)
+    return future
+
+  def send_batch(self: Any, batch: Batch) -> 'asyncio.Future[List[List[Response]]]':
+    assert self.alive(), 'AgdaSession is not started'
+
+    loop = asyncio.get_running_loop()
+    futures = []
+    for record in batch.records:
+      future = loop.create_future()
+      if record is not None:
+        record.sent = time.time()
+      self._pending.append((future, [], record, time.perf_counter()))
+      futures.append(future)
+
+    self.process.stdin.write(batch.buffer)
+    return asyncio.gather(*futures)
+
+  def abort(self: Any):
+    # Agda does not prompt after `Cmd_abort`, the command running ends with `DoneAborting` among its responses.
+    # With no command in flight there is nothing to abort, and Agda's answer would end up with the next command.
+    assert self.commands is not None, 'Session was started without a source file'
+    if len(self._pending) > 0:
+      self._write(self.commands.abort())
+
+  async def drain(self: Any):
+    await self.process.stdin.drain()
+
+  def _write(self: Any, command: str):
+    self.process.stdin.write((command + '\n').encode('utf-8'))
+
+  async def _read(self: Any):
+    try:
+      while True:
+        data = await self.process.stdout.read(CHUNK)
+        if data == b'':
+          break
+
+        for event in self._decoder.feed(data):
+          if len(self._pending) == 0:
+            log.warning(f'Dropping unexpected Agda output: {event!r}')
+          elif isinstance(event, Prompt):
+            future, responses, record, started = self._pending.popleft()
+            if record is not None:
+              # Queued commands wait for the ones before them, so this is the latency seen by the caller
+              record.latency = time.perf_counter() - started
+            if not future.done():
+              future.set_result(responses)
+          else:
+            self._pending[0][1].append(event)
+    finally:
+      code = await self.process.wait()
+      while len(self._pending) > 0:
+        future = self._pending.popleft()[0]
+        if not future.done():
+          future.set_exception(SessionError(f'Agda exited with code {code}'))
@@ -1,119 +1,484 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import bisect
 import datetime
+import inspect
+import json
 import os
 import random
+import re
+import shlex
 import subprocess
-import tempfile
+import sys
+import time
 from os import path
 from typing import *
 
 from prompt_toolkit import PromptSession
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.completion import CompleteEvent, Completer, Completion
+from prompt_toolkit.document import Document
 from prompt_toolkit.formatted_text import HTML
-from prompt_toolkit.history import FileHistory
+from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.styles import Style
 
 from args import *
+from commands import Commands, Range, backends, computeModes, interactions, range_parser, removeOrKeep, rewriteModes, useForce
 from config import *
-from util import Logging, emojis, module_name_from_file_name
+from interaction import AgdaSession, DisplayInfo, Error, GoalsDisplay, HighlightingInfo, RunningInfo, Response
+from scratch import PreludeCache, Scratch, Snapshot, include_flags
+from source import imports
+from util import BoundedHistory, HistorySuggest, Logging, emojis, module_name_from_file_name
 
 log = Logging()()
 
+KEYWORDS: List[str] = [
+  'abstract', 'data', 'field', 'import', 'infix', 'infixl', 'infixr', 'instance', 'interleaved', 'macro', 'module', 'mutual', 'opaque', 'open',
+  'pattern', 'postulate', 'primitive', 'private', 'record', 'syntax', 'unquoteDecl', 'unquoteDef', 'variable', '{-#', '{-', '--'
+]
+
+
+def is_declaration(code: str) -> bool:
+  # Declarations start with a keyword or have a top-level `:` or `=`, which Agda only lexes as separate tokens
+  tokens = code.split()
+  if len(tokens) == 0 or tokens[0] in ['let', 'λ', '\\'] or re.match(r'record\s*\{', code):
+    return False
+  if tokens[0] in KEYWORDS or any([code.startswith(k) for k in ['{-', '--']]):
+    return True
+
+  depth = 0
+  for token in re.findall(r'[(){}]|[^\s(){}]+', code):
+    if token in ['(', '{']:
+      depth += 1
+    elif token in [')', '}']:
+      depth -= 1
+    elif depth == 0 and token in [':', '=']:
+      return True
+  return False
+
+
+def quote(expr: str) -> str:
+  return expr.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def ok(responses: List[Response]) -> bool:
+  return not any([isinstance(r, Error) or (isinstance(r, GoalsDisplay) and len(r.errors) > 0) for r in responses])
+
+
+def script_inputs(text: str) -> List[Tuple[int, str]]:
+  """The inputs of a script with the lines they start on, one per line except for declarations.
+
+  Indented lines continue the input before them, as in a multi-line declaration. Declarations on consecutive lines
+  form one input, so that a signature is checked along with its clauses. A blank line ends a group of declarations.
+  """
+  inputs: List[Tuple[int, str]] = []
+  declarations = False
+  blank = False
+  for n, line in enumerate(text.splitlines(), 1):
+    if line.strip() == '':
+      blank = True
+      continue
+    declaration = not line[0].isspace() and line[0] not in [':', '!'] and is_declaration(line)
+    if len(inputs) > 0 and (line[0].isspace() or (declaration and declarations and not blank)):
+      inputs[-1] = (inputs[-1][0], inputs[-1][1] + '\n' + line.rstrip())
+    else:
+      inputs.append((n, line.rstrip()))
+      declarations = declaration
+    blank = False
+  return inputs
+
+
+class ScopeCompleter(Completer):
+  """Completes the REPL vocabulary, the names in scope of the scratch module and files in the working directory.
+
+  Names are kept per module in a sorted index for prefix lookup, so updating the scratch module after a definition
+  leaves the (much larger) indices of imported modules untouched. The directory listing is refreshed on mtime change.
+  """
+  def __init__(self, vocabulary: List[str]):
+    self.vocabulary = vocabulary
+    self.modules: Dict[str, List[str]] = {}
+    self._index: Optional[List[Tuple[str, str]]] = None
+    self._files: List[str] = []
+    self._listing: Optional[Tuple[str, float]] = None
+
+  def update(self, module: str, names: List[str]):
+    self.modules[module] = names
+    self._index = None
+
+  def clear(self):
+    self.modules = {}
+    self._index = None
+
+  def index(self) -> List[Tuple[str, str]]:
+    if self._index is None:
+      names = set(self.vocabulary + [n for names in self.modules.values() for n in names])
+      self._index = sorted([(n.lower(), n) for n in names])
+    return self._index
+
+  def files(self) -> List[str]:
+    cwd = os.getcwd()
+    listing = (cwd, os.stat(cwd).st_mtime)
+    if listing != self._listing:
+      self._files = os.listdir(cwd)
+      self._listing = listing
+    return self._files
+
+  def get_completions(self, document: Document, complete_event: CompleteEvent) -> Iterable[Completion]:
+    word = document.get_word_before_cursor(WORD=True)
+    prefix = word.lower()
+
+    index = self.index()
+    i = bisect.bisect_left(index, (prefix, ''))
+    while i < len(index) and index[i][0].startswith(prefix):
+      yield Completion(index[i][1], start_position=-len(word))
+      i += 1
+
+    for f in self.files():
+      if f.lower().startswith(prefix):
+        yield Completion(f, start_position=-len(word))
+
 
 class Repl():
   def __init__(self, args=None):
-    self.commands = [
-      'compile', 'load', 'constraints', 'metas', 'show_module_contents_toplevel', 'search_about_toplevel', 'solveAll', 'solveOne', 'autoAll',
-      'autoOne', 'auto', 'infer_toplevel', 'compute_toplevel', 'load_highlighting_info', 'tokenHighlighting', 'highlight', 'give', 'refine', 'intro',
-      'refine_or_intro', 'context', 'helper_function', 'infer', 'goal_type', 'elaborate_give', 'goal_type_context', 'goal_type_context_infer',
-      'goal_type_context_check', 'show_module_contents', 'make_case', 'why_in_scope', 'compute', 'why_in_scope_toplevel', 'show_version', 'abort'
-    ]
+    self.commands = interactions
 
-    self.arguments = ['--file', '--backend', '--cmds', '--rewrite', '--expr', '--interactionId', '--where', '--computeMode', '--remove', '--whether']
-
-    self.static = [
-      "GHC", "GHCNoMain", "LaTeX", "QuickLaTeX", "AsIs", "Instantiated", "HeadNormal", "Simplified", "Normalised", "DefaultCompute", "IgnoreAbstract",
-      "UseShowInstance", "Remove", "Keep", "WithForce", "WithoutForce"
+    self.arguments = [
+      '--file', '--backend', '--cmds', '--rewrite', '--expr', '--interactionId', '--where', '--computeMode', '--remove', '--whether', '--force'
     ]
 
+    self.static = backends + rewriteModes + computeModes + removeOrKeep + useForce
+
     self.style = Style.from_dict({'pygments.comment': '#888888 bold', 'pygments.keyword': '#ff88ff bold', 'bottom-toolbar': '#56c bg:#ccc'})
 
-    self.args = args
+    self.args = args if args is not None else {}
     self.session = None
-    self.temp = None
+    self.script: Optional[str] = self.args.get('script')
+    self.messages: List[str] = []
+    self.scratch: Optional[Scratch] = None
+    self.agda: Optional[AgdaSession] = None
+    self.pending: Optional[asyncio.Task] = None
+    self.status = 'starting'
+    self.completer = ScopeCompleter(self.commands + self.static + self.arguments)
 
   def get_local_files(self) -> List[str]:
-    return os.listdir(os.getcwd())
+    return self.completer.files()
 
   def prompt(self):
     now = datetime.datetime.now()
     return path.split(os.getcwd())[-1] + ' - ' + ':'.join([format(now.hour, '02'), format(now.minute, '02'), format(now.second, '02')])
 
-  def run(self, history='~/.refl_history'):
+  def flags(self) -> List[str]:
+    includes = [path.abspath(i) for i in self.args.get('includes') or []]
+    flags = ['--library', self.args['library']] if self.args.get('library') else []
+
+    if self.args.get('prelude'):
+      # Load the prelude from interfaces cached under ~/.refl/preludes, fall back to checking it in place
+      cached = PreludeCache(includes=includes, flags=flags)(self.args['prelude'])
+      includes = [cached if cached is not None else path.abspath(path.dirname(self.args['prelude']))] + includes
+    return flags + include_flags(includes)
+
+  def show(self, responses: List[Response]):
+    for response in responses:
+      text = str(response)
+      if text != '' and not isinstance(response, RunningInfo):
+        self.say(text)
+
+  def say(self, text: str):
+    # Scripts report everything as JSON, so their messages go with the result of the current input
+    if self.script is not None:
+      self.messages.append(text)
+    else:
+      print(text)
+
+  async def evaluate(self, expr: str) -> List[Response]:
+    # Queries run against the loaded scratch module, nothing is written to disk
+    return await self.agda.compute_toplevel('DefaultCompute', quote(expr))
+
+  async def infer(self, expr: str) -> List[Response]:
+    return await self.agda.infer_toplevel('Normalised', quote(expr))
+
+  async def dispatch(self, command: str, rest: str) -> Optional[List[Response]]:
+    # `:goal_type_context --interactionId 0 --expr "x"` or positionally `:goal_type_context Simplified 0`
+    if command not in self.commands:
+      self.say(f'Unknown command :{command}')
+      return None
+
+    try:
+      tokens = shlex.split(rest)
+    except ValueError as e:
+      self.say(f'Could not parse arguments: {e}')
+      return None
+
+    positional: List[str] = []
+    named: Dict[str, str] = {}
+    while len(tokens) > 0:
+      token = tokens.pop(0)
+      if token in self.arguments and len(tokens) > 0:
+        named[token[2:]] = tokens.pop(0)
+      else:
+        positional.append(token)
+
+    commands = Commands(path.abspath(named.pop('file'))) if 'file' in named else self.agda.commands
+    if command == 'abort':
+      self.agda.abort()
+      return []
+
+    method = getattr(commands, command)
+    parameters = inspect.signature(method).parameters
+    try:
+      args = [self.coerce(p, v, commands.srcFile) for p, v in zip(parameters.values(), positional)]
+      kwargs = {k: self.coerce(parameters[k], v, commands.srcFile) for k, v in named.items()}
+      iotcm = method(*args, **kwargs)
+    except (AssertionError, KeyError, TypeError, ValueError) as e:
+      self.say(f'Invalid arguments for :{command} {rest}: {e}')
+      return None
+
+    if command == 'load':
+      self.agda.loaded = commands.srcFile
+    return await self.agda.send(iotcm, commands.history.last)
+
+  def coerce(self, parameter: inspect.Parameter, value: str, srcFile: str) -> Any:
+    if parameter.annotation is int:
+      return int(value)
+    elif parameter.annotation is bool:
+      return value.lower() in ['true', 'yes', '1']
+    elif parameter.annotation is Range:
+      return range_parser(srcFile, value)
+    elif parameter.name == 'cmds':
+      return [c for c in value.split(',') if c != '']
+    elif parameter.name == 'expr':
+      return quote(value)
+    return value
+
+  async def contents(self, module: str) -> List[str]:
+    names = []
+    for response in await self.agda.show_module_contents_toplevel('Simplified', module):
+      if isinstance(response, DisplayInfo) and response.infoKind == 'ModuleContents':
+        names += [c['name'] for c in response.info.get('contents', [])] + response.info.get('names', [])
+    return names
+
+  async def index(self):
+    # The scratch modules change with every definition, imported modules are only asked for once
+    self.completer.update('', await self.contents(''))
+
+    for module in imports('\n'.join(self.scratch.imports(self.scratch.head))):
+      if module not in self.completer.modules:
+        self.completer.update(module, await self.contents(module))
+
+  async def check(self) -> List[Response]:
+    # Typecheck only the newest scratch module, compiling happens on `:compile`
+    self.status = 'checking…'
+    self.agda.commands.srcFile = self.scratch.srcFile
+    responses = await self.agda.load([])
+
+    clean = ok(responses) and not any([isinstance(r, GoalsDisplay) and len(r.visibleGoals + r.invisibleGoals) > 0 for r in responses])
+    self.status = 'ok' if clean else 'error'
+    self.show(responses)
+
+    # Queries keep going to the module just checked, the next definition starts a new one
+    if clean:
+      self.scratch.seal()
+    # Names in scope only feed the completer, scripts have none
+    if self.script is None:
+      await self.index()
+    return responses
+
+  def recheck(self):
+    # A newer version of the scratch file supersedes a check still running in the background
+    if self.pending is not None and not self.pending.done():
+      self.agda.abort()
+      self.pending.cancel()
+    self.pending = asyncio.create_task(self.check())
+
+  async def changed(self) -> List[Response]:
+    # Interactively the check runs in the background, scripts wait for it to report its result
+    self.recheck()
+    return await self.pending if self.script is not None else []
+
+  async def save(self, name: str) -> bool:
+    # Wait for the check in flight, so that the newest interfaces are saved along with the sources
+    if name == '':
+      self.say('Usage: :save NAME')
+      return False
+    if self.pending is not None:
+      await asyncio.gather(self.pending, return_exceptions=True)
+    try:
+      Snapshot(name).save(self.scratch, self.args)
+    except (AssertionError, OSError) as e:
+      self.say(f'Could not save session {name}: {e}')
+      return False
+    self.say(f'Saved session {name}, resume it with `refl repl agda --resume {name}`')
+    return True
+
+  def export(self, filename: str) -> bool:
+    # The latest commands sent to Agda with their latencies, as JSON lines
+    if filename == '':
+      self.say('Usage: :history FILE')
+      return False
+    try:
+      with open(path.expanduser(filename), 'w') as f:
+        self.agda.commands.history.export(f)
+    except OSError as e:
+      self.say(f'Could not write history to {filename}: {e}')
+      return False
+    self.say(f'Wrote {len(self.agda.commands.history)} commands to {filename}')
+    return True
+
+  def toolbar(self) -> HTML:
+    return HTML(f'  <b><style bg="hotpink">Refl ♠</style></b> the Agda REPL [{self.status}]. Docs: http://monoid.space/refl.html')
+
+  def resume(self, name: str) -> bool:
+    # A resumed session brings back its scratch modules and interfaces, and its prelude unless another one was given
+    try:
+      self.scratch, saved = Snapshot(name).load()
+    except (AssertionError, OSError, ValueError) as e:
+      log.error(f'Could not resume session {name}: {e}')
+      return False
+    self.args.update({k: v for k, v in saved.items() if not self.args.get(k)})
+    return True
+
+  def run(self, history='~/.refl_history') -> int:
+    if self.args.get('resume') and not self.resume(self.args['resume']):
+      return 1
+    if self.script is not None:
+      return asyncio.run(self.batch(self.script))
+    asyncio.run(self.main(history))
+    return 0
+
+  async def start(self):
+    # Prepare the scratch modules which we are going to use for this REPL session
+    preamble = [f'import {module_name_from_file_name(path.basename(self.args["prelude"]))}'] if self.args.get('prelude') else []
+    self.scratch = self.scratch if self.scratch is not None else Scratch(preamble=preamble)
+
+    # One Agda process lives as long as the REPL, every definition is checked in the background by loading the newest scratch module
+    self.agda = self.agda if self.agda is not None else AgdaSession(
+      self.scratch.srcFile, flags=self.flags() + include_flags([self.scratch.directory]), cwd=self.scratch.directory)
+    await self.agda.start()
+    self.recheck()
+
+  async def stop(self):
+    if self.pending is not None:
+      self.pending.cancel()
+      await asyncio.gather(self.pending, return_exceptions=True)
+    await self.agda.close()
+
+  async def handle(self, user_input: str) -> Optional[List[Response]]:
+    # Runs one input and returns Agda's responses to it, None if the input was rejected
+    responses: Optional[List[Response]] = []
+
+    # agda command
+    if user_input[0] == ':':
+      command, _, rest = user_input[1:].partition(' ')
+      if command == 'compile':
+        backend = rest.strip() or 'GHCNoMain'
+        if backend not in backends:
+          self.say(f'Unknown backend {backend}, use one of {", ".join(backends)}')
+          return None
+        responses = await self.agda.compile(backend, [])
+      elif command in ['eval', 'e']:
+        responses = await self.evaluate(rest)
+      elif command in ['type', 't']:
+        responses = await self.infer(rest)
+      elif command == 'save':
+        if not await self.save(rest.strip()):
+          return None
+      elif command == 'history':
+        if not self.export(rest.strip()):
+          return None
+      elif command == 'undo':
+        if self.scratch.undo():
+          return await self.changed()
+        self.say('Nothing to undo')
+      else:
+        responses = await self.dispatch(command, rest)
+
+    # shell command
+    elif user_input[0] == '!':
+      user_input = user_input[1:]
+      subprocess.call(user_input, shell=True)
+    # clear shell
+    elif user_input == 'clear' or user_input == 'c':
+      subprocess.call('clear', shell=True)
+    # clear repl history
+    elif user_input == 'new':
+      self.scratch.reset()
+      self.completer.clear()
+      return await self.changed()
+    # expression
+    elif not is_declaration(user_input):
+      responses = await self.evaluate(user_input)
+    # agda code
+    else:
+      self.scratch.add(user_input)
+      return await self.changed()
+
+    self.show(responses or [])
+    return responses
+
+  async def attempt(self, user_input: str) -> Optional[List[Response]]:
+    # An input which fails unexpectedly is reported, the REPL and its Agda session go on
+    try:
+      return await self.handle(user_input)
+    except Exception as e:
+      log.debug(f'Could not run {user_input!r}', exc_info=True)
+      self.say(f'Error: {type(e).__name__}: {e}')
+      return None
+
+  async def main(self, history='~/.refl_history'):
     history = path.abspath(path.expanduser(history))
 
     if not path.exists(history):
       os.mknod(history)
 
-    self.session = self.session if self.session is not None else PromptSession(history=FileHistory(history))
-    self.temp = self.temp if self.temp is not None else tempfile.NamedTemporaryFile(suffix='.agda', mode='a+').name
-    AGDA = ['agda', '--no-main', '--compile']
-
-    # For temp file xyz.agda, generate `module xyz where`
-    header = f'module {module_name_from_file_name(path.basename(self.temp))} where'
-
-    # Prepare the temp file which we are going to use for this REPL session
-    with open(self.temp, 'a+') as temp:
-      temp.write(header + '\n\n')
-
-      print(self.args)
-      if 'prelude' in self.args:
-        prelude = f'import {module_name_from_file_name(path.basename(self.args["prelude"]))}'
-        prelude_path = path.abspath(path.dirname(self.args['prelude']))
-        temp.write(prelude + '\n\n')
-        AGDA += ['--include-path', prelude_path]
-
-    print(AGDA)
-    subprocess.call(AGDA + [self.temp], cwd='/tmp')
-
-    while 1:
-      user_input = self.session.prompt(HTML(
-        f'<b><style fg="#08f">refl★</style></b> {random.choice(emojis)}<b><style fg="#08f">  {self.prompt()} </style></b> <b><style fg="hotpink">⟹</style></b>  '
-      ),
-                                       auto_suggest=AutoSuggestFromHistory(),
-                                       completer=WordCompleter(self.commands + self.get_local_files() + self.static + self.arguments,
-                                                               ignore_case=True),
-                                       style=self.style,
-                                       bottom_toolbar=HTML(
-                                         '  <b><style bg="hotpink">Refl ♠</style></b> the Agda REPL. Docs: http://monoid.space/refl.html'))
-
-      user_input = user_input.strip()
-
-      # input not empty
-      if user_input != '':
-        # agda command
-        if user_input[0] == ':':
-          user_input = user_input[1:]
-          print(user_input)
-
-        # shell command
-        elif user_input[0] == '!':
-          user_input = user_input[1:]
-          subprocess.call(user_input, shell=True)
-        # clear shell
-        elif user_input == 'clear' or user_input == 'c':
-          subprocess.call('clear', shell=True)
-        # clear repl history
-        elif user_input == 'new':
-          with open(self.temp, 'w') as temp:
-            temp.write(header + '\n\n')
-        # agda code
-        else:
-          with open(self.temp, 'a+') as temp:
-            temp.write(f'''{str(user_input)}\n\n''')
-            temp.close()
-
-          subprocess.call(AGDA + [self.temp], cwd='/tmp')
+    self.session = self.session if self.session is not None else PromptSession(history=BoundedHistory(history))
+    await self.start()
+
+    try:
+      with patch_stdout():
+        while 1:
+          user_input = await self.session.prompt_async(HTML(
+            f'<b><style fg="#08f">refl★</style></b> {random.choice(emojis)}<b><style fg="#08f">  {self.prompt()} </style></b> <b><style fg="hotpink">⟹</style></b>  '
+          ),
+                                                       auto_suggest=HistorySuggest(),
+                                                       completer=self.completer,
+                                                       style=self.style,
+                                                       bottom_toolbar=self.toolbar,
+                                                       refresh_interval=0.5)
+
+          user_input = user_input.strip()
+
+          # input not empty
+          if user_input != '':
+            await self.attempt(user_input)
+    finally:
+      await self.stop()
+
+  async def batch(self, script: str) -> int:
+    # Every input of the script gets one JSON line on stdout, the exit code tells whether all of them went through
+    with (sys.stdin if script == '-' else open(script)) as f:
+      inputs = script_inputs(f.read())
+
+    await self.start()
+    failures = 0
+    try:
+      # The empty scratch module is checked before the first input, like in the interactive REPL
+      await asyncio.gather(self.pending, return_exceptions=True)
+      for line, user_input in inputs:
+        self.messages = []
+        started = time.perf_counter()
+        responses = await self.attempt(user_input)
+        passed = responses is not None and ok(responses)
+        failures += 0 if passed else 1
+
+        print(json.dumps({
+          'line': line,
+          'input': user_input,
+          'ok': passed,
+          'time': round(time.perf_counter() - started, 6),
+          'output': '\n'.join(self.messages),
+          'responses': [r.data for r in responses or [] if not isinstance(r, (HighlightingInfo, RunningInfo))],
+        }, ensure_ascii=False), flush=True)
+    finally:
+      await self.stop()
+    return 1 if failures > 0 else 0
@@ -2,5 +2,6 @@
 # -*- coding: utf-8 -*-
 
 from .agda_project import *
+from .build import *
 from .install import *
 from .refl_project import *
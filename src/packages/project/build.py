@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from os import path
+from typing import *
+
+from tqdm import tqdm
+
+from scratch import include_flags
+from source import extensions, imports, parse_library, project_library, resolve
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+# The module importing every library module of the project, checked before the project's own modules
+LIBRARIES = 'ReflLibraries'
+
+
+@dataclass
+class BuildResult:
+  module: str
+  srcFile: str
+  status: str
+  time: float = 0.0
+  output: str = ''
+
+
+class Build:
+  """Typechecks every module under a project's includes, modules which do not depend on each other in parallel.
+
+  A module is checked once all the modules it imports from the project are, by one of at most `jobs` Agda processes.
+  That process finds the interfaces of those imports already written and only loads them. Modules importing a
+  module which failed are skipped.
+
+  Interfaces of library modules are shared by all those processes, so the modules the project imports from libraries
+  are first checked by a single process, lest several of them write the same interface at once. That process is
+  given `flags` and the libraries the project's `.agda-lib` depends on.
+  """
+  def __init__(self: Any, includes: List[str], jobs: Optional[int] = None, agda: str = 'agda', flags: List[str] = []):
+    self.includes = [path.abspath(i) for i in includes]
+    self.jobs = jobs if jobs is not None else os.cpu_count() or 1
+    self.agda = agda
+    self.flags = flags
+
+  def modules(self: Any) -> Dict[str, str]:
+    # Source files by module name, the first include wins like it does for Agda
+    found: Dict[str, str] = {}
+    for include in self.includes:
+      for directory, _, files in os.walk(include):
+        for f in sorted(files):
+          ext = next((e for e in extensions if f.endswith(e)), None)
+          if ext is None:
+            continue
+          module = path.relpath(path.join(directory, f[:-len(ext)]), include).replace(os.sep, '.')
+          found.setdefault(module, path.join(directory, f))
+    return found
+
+  def graph(self: Any, modules: Dict[str, str]) -> Dict[str, Set[str]]:
+    # The modules of the project each module imports, others come from libraries
+    return {m: set([i for i in imported if self._local(i, modules)]) for m, imported in self._imported(modules).items()}
+
+  def libraries(self: Any, modules: Dict[str, str]) -> List[str]:
+    # The modules the project imports from elsewhere
+    return sorted(set([i for imported in self._imported(modules).values() for i in imported if not self._local(i, modules)]))
+
+  def prepare(self: Any, modules: Dict[str, str]) -> Optional[BuildResult]:
+    """Check the library modules the project imports in one Agda process, if it imports any.
+    """
+    imported = self.libraries(modules)
+    if len(imported) == 0:
+      return None
+
+    flags = []
+    library = project_library(next(iter(modules.values())))
+    if library is not None:
+      flags = ['--library=' + d for d in parse_library(library).get('depend', [])]
+
+    directory = tempfile.mkdtemp(prefix='refl-')
+    try:
+      srcFile = path.join(directory, LIBRARIES + '.agda')
+      with open(srcFile, 'w', encoding='utf-8') as f:
+        f.write(f'module {LIBRARIES} where\n' + ''.join([f'import {i}\n' for i in imported]))
+      return self.check(LIBRARIES, srcFile, flags + include_flags([directory]))
+    finally:
+      shutil.rmtree(directory, ignore_errors=True)
+
+  def __call__(self: Any, progress: bool = True) -> List[BuildResult]:
+    modules = self.modules()
+    graph = self.graph(modules)
+
+    # A failure here is reported again by the modules importing the culprit
+    prepared = self.prepare(modules)
+    if prepared is not None and prepared.status != OK:
+      log.warning(f"Could not check the imported library modules:\n{prepared.output.strip()}")
+
+    # Modules waiting for their imports, and for each module the ones waiting for it
+    waiting = {m: set(imported) for m, imported in graph.items()}
+    dependents: Dict[str, List[str]] = {m: [] for m in graph}
+    for m, imported in graph.items():
+      for i in imported:
+        dependents[i].append(m)
+
+    results: Dict[str, BuildResult] = {}
+    bar = tqdm(total=len(modules), unit='module', disable=not progress)
+    with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+      running: Dict[Future, str] = {}
+
+      def submit():
+        for m in sorted([m for m, imported in waiting.items() if len(imported) == 0]):
+          del waiting[m]
+          running[pool.submit(self.check, m, modules[m])] = m
+
+      def skip(m: str, cause: str):
+        for d in dependents[m]:
+          if d in waiting:
+            del waiting[d]
+            results[d] = BuildResult(d, modules[d], SKIPPED, output=f'Imports {cause}, which failed')
+            bar.update(1)
+            skip(d, cause)
+
+      submit()
+      while len(running) > 0:
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        for future in done:
+          m = running.pop(future)
+          result = results[m] = future.result()
+          bar.update(1)
+          bar.set_postfix_str(m)
+          if result.status == OK:
+            for d in dependents[m]:
+              if d in waiting:
+                waiting[d].discard(m)
+          else:
+            skip(m, m)
+        submit()
+
+    # Whatever still waits is on an import cycle
+    for m in sorted(waiting):
+      results[m] = BuildResult(m, modules[m], FAILED, output='Import cycle through ' + ', '.join(sorted(waiting[m])))
+      bar.update(1)
+    bar.close()
+    return [results[m] for m in sorted(results)]
+
+  def check(self: Any, module: str, srcFile: str, flags: List[str] = []) -> BuildResult:
+    started = time.perf_counter()
+    process = subprocess.run([self.agda] + self.flags + flags + include_flags(self.includes) + [srcFile],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    return BuildResult(module, srcFile, OK if process.returncode == 0 else FAILED, time.perf_counter() - started, process.stdout)
+
+  def _local(self: Any, module: str, modules: Dict[str, str]) -> bool:
+    return module in modules and resolve(module, self.includes) == modules[module]
+
+  def _imported(self: Any, modules: Dict[str, str]) -> Dict[str, Set[str]]:
+    imported: Dict[str, Set[str]] = {}
+    for module, srcFile in modules.items():
+      with open(srcFile, encoding='utf-8') as f:
+        imported[module] = set(imports(f.read(), srcFile))
+    return imported
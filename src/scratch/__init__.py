@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from .prelude import *
+from .scratch import *
+from .snapshot import *
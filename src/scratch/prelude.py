@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import subprocess
+from os import path
+from typing import *
+
+from config import ROOT
+from source import closure, file_hash
+from util import agda_version
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+DONE = '.complete'
+
+
+class PreludeCache:
+  """Typechecked copies of REPL preludes, content-addressed under `~/.refl/preludes`.
+
+  A prelude and the modules it imports from its own directory are copied into a directory named after the hash of
+  their sources, the Agda version and the flags, and typechecked there once. Later REPLs include that directory
+  instead of the prelude's, so Agda only has to load the interface files.
+  """
+  def __init__(self: Any, root: str = path.join(ROOT, 'preludes'), agda: str = 'agda', includes: List[str] = [], flags: List[str] = []):
+    self.root = root
+    self.agda = agda
+    self.includes = includes
+    self.flags = flags
+
+  def key(self: Any, prelude: str) -> str:
+    h = hashlib.sha256(f'{agda_version(self.agda)}:{" ".join(self.flags)}:{file_hash(prelude)}'.encode('utf-8'))
+    for module, location in sorted(closure(prelude, self._includes(prelude)).items()):
+      h.update(f'{module}:{file_hash(location)}'.encode('utf-8'))
+    return h.hexdigest()
+
+  def __call__(self: Any, prelude: str) -> Optional[str]:
+    prelude = path.abspath(prelude)
+    directory = path.join(self.root, self.key(prelude))
+
+    if path.exists(path.join(directory, DONE)):
+      return directory
+    shutil.rmtree(directory, ignore_errors=True)
+
+    # Only modules next to the prelude are copied, copying the others would make their names ambiguous
+    root = path.dirname(prelude)
+    sources = [prelude] + [p for p in closure(prelude, self._includes(prelude)).values() if p.startswith(root + os.sep)]
+    for source in sources:
+      target = path.join(directory, path.relpath(source, root))
+      os.makedirs(path.dirname(target), exist_ok=True)
+      shutil.copyfile(source, target)
+
+    log.info(f'Typechecking prelude {prelude}, this happens only once')
+    includes = include_flags([directory] + [i for i in self.includes if path.abspath(i) != root])
+    ret = subprocess.run([self.agda] + self.flags + includes + [path.join(directory, path.basename(prelude))], cwd=directory).returncode
+    if ret != 0:
+      log.error(f'Could not typecheck prelude {prelude}')
+      shutil.rmtree(directory, ignore_errors=True)
+      return None
+
+    with open(path.join(directory, DONE), 'w') as done:
+      done.write(prelude + '\n')
+    return directory
+
+  def _includes(self: Any, prelude: str) -> List[str]:
+    return [path.dirname(path.abspath(prelude))] + self.includes
+
+
+def include_flags(includes: List[str]) -> List[str]:
+  return [f for i in includes for f in ['--include-path', path.abspath(i)]]
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import tempfile
+from os import path
+from typing import *
+
+IMPORT = re.compile(r'^(open\s+)?import\s')
+OPEN = re.compile(r'^open\s')
+OPEN_MODULE = re.compile(r'^open\s+module\s+(\S+)')
+DIRECTIVE = re.compile(r'\s(using|hiding|renaming|public)\b.*', re.DOTALL)
+
+
+class Scratch:
+  """The code typed into a REPL, as a chain of modules `Scratch0`, `Scratch1`, ...
+
+  Each module publicly opens the previous one, so checking the newest module only checks the code added to it and
+  loads the interfaces of the earlier ones. The newest module stays open for more code until it checks cleanly, then
+  it is sealed and a new one is started. Imports and opens are repeated in every later module, as they are not
+  re-exported.
+  """
+  def __init__(self: Any, directory: Optional[str] = None, preamble: List[str] = [], prefix: str = 'Scratch', blocks: Optional[List[List[str]]] = None):
+    self.directory = directory if directory is not None else tempfile.mkdtemp(prefix='refl-')
+    self.preamble = preamble
+    self.prefix = prefix
+    self.blocks: List[List[str]] = blocks if blocks is not None else [[]]
+
+    # Restored modules are left untouched, so that their interfaces stay valid
+    for block in range(len(self.blocks)):
+      if blocks is None or not path.exists(self.file(block)):
+        self.write(block)
+
+  @property
+  def head(self: Any) -> int:
+    return len(self.blocks) - 1
+
+  @property
+  def srcFile(self: Any) -> str:
+    return self.file(self.head)
+
+  @property
+  def module(self: Any) -> str:
+    return self.name(self.head)
+
+  def name(self: Any, block: int) -> str:
+    return f'{self.prefix}{block}'
+
+  def file(self: Any, block: int) -> str:
+    return path.join(self.directory, self.name(block) + '.agda')
+
+  def imports(self: Any, block: int) -> List[str]:
+    return self.preamble + [opening(code) for b in self.blocks[:block] for code in b if OPEN.match(code) or IMPORT.match(code)]
+
+  def source(self: Any, block: int) -> str:
+    lines = [f'module {self.name(block)} where']
+    if block > 0:
+      lines += [f'open import {self.name(block - 1)} public']
+    lines += self.imports(block) + self.blocks[block]
+    return '\n\n'.join(lines) + '\n'
+
+  def write(self: Any, block: int):
+    with open(self.file(block), 'w') as f:
+      f.write(self.source(block))
+
+  def add(self: Any, code: str):
+    self.blocks[-1].append(code)
+    self.write(self.head)
+
+  def seal(self: Any) -> bool:
+    # Called once the newest module checked cleanly, later code goes to a new module
+    if len(self.blocks[-1]) == 0:
+      return False
+    self.blocks.append([])
+    self.write(self.head)
+    return True
+
+  def undo(self: Any) -> bool:
+    # Drop the last code of the open module, or else the last sealed module altogether
+    if len(self.blocks[-1]) > 0:
+      self.blocks[-1].pop()
+      self.write(self.head)
+      return True
+    if len(self.blocks) == 1:
+      return False
+
+    self._remove(self.head)
+    self.blocks.pop()
+    self._remove(self.head)
+    self.blocks[-1] = []
+    self.write(self.head)
+    return True
+
+  def reset(self: Any):
+    for block in range(len(self.blocks)):
+      self._remove(block)
+    self.blocks = [[]]
+    self.write(0)
+
+  def _remove(self: Any, block: int):
+    # Interfaces go along with their sources so that a later module with the same name is checked again
+    base = self.file(block)[:-len('.agda')]
+    for f in [base + '.agda', base + '.agdai']:
+      if path.exists(f):
+        os.remove(f)
+
+
+def opening(code: str) -> str:
+  # `open module X = ...` defines X, which later modules already get from the previous one, they only open it again
+  match = OPEN_MODULE.match(code)
+  if match is None:
+    return code
+  directive = DIRECTIVE.search(code)
+  return f'open {match.group(1)}' + (directive.group(0) if directive is not None else '')
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+import tempfile
+from os import path
+from typing import *
+
+from config import ROOT
+from scratch.scratch import Scratch
+from util import agda_version
+from util.log import LOGLEVEL, Logging
+
+log = Logging(LOGLEVEL)()
+
+SESSIONS = path.join(ROOT, 'sessions')
+STATE = 'session.json'
+
+
+class Snapshot:
+  """A saved REPL session under `~/.refl/sessions/<name>`.
+
+  The scratch modules are stored along with their interface files and the REPL's prelude configuration, so a
+  resumed session only has to load interfaces for code which did not change.
+  """
+  def __init__(self: Any, name: str, root: str = SESSIONS):
+    assert name != '' and path.basename(name) == name, f'Invalid session name {name}'
+    self.name = name
+    self.location = path.join(root, name)
+
+  def exists(self: Any) -> bool:
+    return path.exists(path.join(self.location, STATE))
+
+  def save(self: Any, scratch: Scratch, args: Dict[str, Any]):
+    shutil.rmtree(self.location, ignore_errors=True)
+    shutil.copytree(scratch.directory, path.join(self.location, 'scratch'))
+
+    state = {
+      'args': {k: args.get(k) for k in ['prelude', 'includes', 'library']},
+      'preamble': scratch.preamble,
+      'prefix': scratch.prefix,
+      'blocks': scratch.blocks,
+      'agda': agda_version(),
+    }
+    with open(path.join(self.location, STATE), 'w') as f:
+      json.dump(state, f, indent=2)
+    log.info(f'Saved session {self.name} to {self.location}')
+
+  def load(self: Any) -> Tuple[Scratch, Dict[str, Any]]:
+    assert self.exists(), f'No saved session named {self.name}'
+
+    with open(path.join(self.location, STATE)) as f:
+      state = json.load(f)
+    if state.get('agda') != agda_version():
+      log.warning(f'Session {self.name} was saved with Agda {state.get("agda")}, its modules will be checked again')
+
+    directory = tempfile.mkdtemp(prefix='refl-')
+    shutil.copytree(path.join(self.location, 'scratch'), directory, dirs_exist_ok=True)
+    return Scratch(directory, state['preamble'], state['prefix'], state['blocks']), state['args']
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from .holes import *
+from .imports import *
+from .libraries import *
+from .lines import *
+from .literate import *
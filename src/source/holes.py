@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import hashlib
+import re
+from collections import OrderedDict
+from os import path
+from typing import *
+
+from source.lines import LineIndex
+from source.literate import illiterate
+
+# Everything outside of comments, pragmas and strings that can start a hole or hide one
+TOKEN = re.compile(r'\{-|\{!|--(?![!#$%&*+./<=>?@\\^|~:-])|"|(?<![^\s(){};@"])\'|(?<![^\s(){};@"])\?(?![^\s(){};.@"])')
+COMMENT = re.compile(r'\{-|-\}')
+BRACES = re.compile(r'\{!|!\}')
+STRING = re.compile(r'"(?:\\.|[^"\\\n])*"?')
+CHARACTER = re.compile(r"'(?:\\[^'\n]+|[^\\'\n])'")
+
+
+class Hole:
+  """An interaction point: a `?` or a `{! ... !}`.
+
+  Offsets are 1-based and count code points like Agda's positions, `end` is the offset just after the hole.
+  """
+  __slots__ = ('srcFile', 'id', 'start', 'end', 'line', 'column', 'endLine', 'endColumn')
+
+  def __init__(self: Any, srcFile: str, id: int, start: int, end: int, lines: LineIndex):
+    self.srcFile = srcFile
+    self.id = id
+    self.start = start
+    self.end = end
+    self.line, self.column = lines.position(start)
+    self.endLine, self.endColumn = lines.position(end)
+
+  def __repr__(self: Any) -> str:
+    return f'Hole({self.id}, {self.line}:{self.column}-{self.endLine}:{self.endColumn})'
+
+  @property
+  def where(self: Any) -> Any:
+    # Imported here, commands imports this module
+    from commands import Interval, Position, Range
+    return Range([Interval(Position(self.srcFile, self.start, self.line, self.column), Position(self.srcFile, self.end, self.endLine, self.endColumn))])
+
+
+def _nested(code: str, start: int, pattern: Pattern, opening: str) -> int:
+  # End of a nested `{- -}` or `{! !}` starting at `start`, the end of the code if it is not closed
+  depth = 0
+  for match in pattern.finditer(code, start):
+    depth += 1 if match.group(0) == opening else -1
+    if depth == 0:
+      return match.end()
+  return len(code)
+
+
+class Scan:
+  """Hole offsets of some code, and the gaps between tokens where the lexer is outside of any comment or string.
+
+  Offsets here are 0-based indices into the code.
+  """
+  __slots__ = ('code', 'holes', 'gaps')
+
+  def __init__(self: Any, code: str, holes: List[Tuple[int, int]], gaps: List[Tuple[int, int]]):
+    self.code = code
+    self.holes = holes
+    self.gaps = gaps
+
+  def resumes(self: Any, offset: int) -> bool:
+    # Whether the lexer looked for the next token from this offset, its only state
+    i = bisect.bisect_left(self.gaps, (offset, ))
+    return i < len(self.gaps) and self.gaps[i][0] == offset
+
+
+def scan(code: str, start: int = 0, resync: Optional[Callable[[int], bool]] = None) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]], int]:
+  """Find holes from `start` on. Stops early at an offset after `start` where the lexer looks for the next token and
+  `resync` holds, returns where it stopped.
+  """
+  holes: List[Tuple[int, int]] = []
+  gaps: List[Tuple[int, int]] = []
+  position = start
+
+  while True:
+    if resync is not None and position != start and resync(position):
+      return holes, gaps, position
+
+    match = TOKEN.search(code, position)
+    if match is None:
+      gaps.append((position, len(code)))
+      return holes, gaps, len(code)
+
+    token = match.group(0)
+    at = match.start()
+    gaps.append((position, at))
+
+    if token == '{-':
+      position = _nested(code, at, COMMENT, '{-')
+    elif token == '{!':
+      position = _nested(code, at, BRACES, '{!')
+      holes.append((at, position))
+    elif token == '?':
+      position = at + 1
+      holes.append((at, position))
+    elif token == '"':
+      position = STRING.match(code, at).end()
+    elif token == "'":
+      character = CHARACTER.match(code, at)
+      position = character.end() if character is not None else at + 1
+    else:
+      newline = code.find('\n', at)
+      position = newline if newline != -1 else len(code)
+
+
+class HoleIndex:
+  """Holes of Agda and literate Agda files, found without asking Agda to load them.
+
+  Scans are cached by the hash of the file's contents. After an edit, only the code from the first change up to the
+  point where the lexer is back in step with the previous scan is scanned again.
+  """
+  def __init__(self: Any, size: int = 64):
+    self.size = size
+    self.scans: 'OrderedDict[str, Scan]' = OrderedDict()
+    self.latest: Dict[str, str] = {}
+
+  def __call__(self: Any, srcFile: str) -> List[Hole]:
+    with open(srcFile, encoding='utf-8', newline='') as f:
+      text = f.read()
+    return self.holes(srcFile, text)
+
+  def holes(self: Any, srcFile: str, text: str) -> List[Hole]:
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    result = self.scans.get(key)
+
+    if result is not None:
+      self.scans.move_to_end(key)
+    else:
+      code = illiterate(text, srcFile)
+      previous = self.scans.get(self.latest.get(path.abspath(srcFile), ''))
+      result = self._update(previous, code) if previous is not None else Scan(code, *scan(code)[:2])
+      self.scans[key] = result
+      while len(self.scans) > self.size:
+        self.scans.popitem(last=False)
+    self.latest[path.abspath(srcFile)] = key
+
+    lines = LineIndex.parse(text.encode('utf-8'))
+    return [Hole(srcFile, i, start + 1, end + 1, lines) for i, (start, end) in enumerate(result.holes)]
+
+  @staticmethod
+  def _update(previous: Scan, code: str) -> Scan:
+    old = previous.code
+
+    # The changed part of the code, as the longest common prefix and suffix
+    prefix = 0
+    limit = min(len(old), len(code))
+    while prefix < limit and old[prefix] == code[prefix]:
+      prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == code[-1 - suffix]:
+      suffix += 1
+    delta = len(code) - len(old)
+    changed = len(code) - suffix
+
+    # Restart where the lexer was before the line of the change, strings and escapes look ahead up to the end of a line
+    g = bisect.bisect_left(previous.gaps, (code.rfind('\n', 0, prefix) + 1, )) - 1
+    start = previous.gaps[g][0] if g >= 0 else 0
+
+    # Stop once the lexer looks for a token in the unchanged suffix where it also did before, from there on it is in step
+    def resync(position: int) -> bool:
+      return changed < position < len(code) and previous.resumes(position - delta)
+
+    holes, gaps, stop = scan(code, start, resync)
+    if stop == len(code):
+      return Scan(code, [h for h in previous.holes if h[0] < start] + holes, [p for p in previous.gaps if p[0] < start] + gaps)
+
+    old = stop - delta
+    return Scan(code, [h for h in previous.holes if h[0] < start] + holes + [(s + delta, e + delta) for s, e in previous.holes if s >= old],
+                [p for p in previous.gaps if p[0] < start] + gaps + [(s + delta, e + delta) for s, e in previous.gaps if s >= old])
+
+
+index = HoleIndex()
+
+
+def holes(srcFile: str) -> List[Hole]:
+  return index(srcFile)
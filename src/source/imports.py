@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import re
+from os import path
+from typing import *
+
+from source.literate import extensions, illiterate
+
+IMPORT = re.compile(r'(?:^|[\s;{])import\s+([^\s;(){}]+)')
+MODULE = re.compile(r'(?:^|[\s;{])module\s+([^\s;(){}]+)')
+
+
+def strip_comments(code: str) -> str:
+  # Block comments nest in Agda, remove innermost ones until none are left
+  while True:
+    stripped = re.sub(r'\{-(?:(?!\{-|-\}).)*?-\}', ' ', code, flags=re.S)
+    if stripped == code:
+      break
+    code = stripped
+  return re.sub(r'--(?![!#$%&*+./<=>?@\\^|~:-]).*?$', '', code, flags=re.M)
+
+
+def imports(text: str, filename: str = '.agda') -> List[str]:
+  code = strip_comments(illiterate(text, filename))
+  return list(dict.fromkeys(IMPORT.findall(code)))
+
+
+def module_name(text: str, filename: str = '.agda') -> Optional[str]:
+  # The name of the top-level module, the first one declared
+  match = MODULE.search(strip_comments(illiterate(text, filename)))
+  return match.group(1) if match is not None else None
+
+
+def include_root(srcFile: str) -> str:
+  """The directory module names of `srcFile` are relative to, e.g. `lib` for `lib/Data/Nat.agda` with `module Data.Nat`.
+  """
+  with open(srcFile, encoding='utf-8') as f:
+    name = module_name(f.read(), srcFile)
+  root = path.dirname(path.abspath(srcFile))
+  for part in reversed((name or '').split('.')[:-1]):
+    if path.basename(root) != part:
+      break
+    root = path.dirname(root)
+  return root
+
+
+def resolve(module: str, includes: List[str]) -> Optional[str]:
+  relative = path.join(*module.split('.'))
+  for include in includes:
+    for ext in extensions:
+      candidate = path.join(include, relative + ext)
+      if path.isfile(candidate):
+        return path.abspath(candidate)
+  return None
+
+
+def closure(srcFile: str, includes: List[str]) -> Dict[str, str]:
+  """Source files of all modules transitively imported by `srcFile`, by module name.
+
+  Modules which are not found in `includes`, e.g. the ones coming from libraries, are left out.
+  """
+  found: Dict[str, str] = {}
+  todo = [srcFile]
+  seen = set([path.abspath(srcFile)])
+
+  while len(todo) > 0:
+    current = todo.pop()
+    with open(current, encoding='utf-8') as f:
+      text = f.read()
+
+    for module in imports(text, current):
+      location = resolve(module, includes)
+      if location is not None and location not in seen:
+        seen.add(location)
+        found[module] = location
+        todo.append(location)
+  return found
+
+
+def file_hash(filename: str) -> str:
+  h = hashlib.sha256()
+  with open(filename, 'rb') as f:
+    for block in iter(lambda: f.read(65536), b''):
+      h.update(block)
+  return h.hexdigest()
+
+
+def closure_hash(srcFile: str, includes: List[str]) -> str:
+  # Changes whenever `srcFile` or anything it (transitively) imports from `includes` changes
+  h = hashlib.sha256(file_hash(srcFile).encode('utf-8'))
+  for module, location in sorted(closure(srcFile, includes).items()):
+    h.update(f'{module}:{file_hash(location)}'.encode('utf-8'))
+  return h.hexdigest()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from os import path
+from typing import *
+
+
+def agda_dir() -> str:
+  return os.environ.get('AGDA_DIR', path.join(path.expanduser('~'), '.agda'))
+
+
+def parse_library(filename: str) -> Dict[str, List[str]]:
+  """Fields of an `.agda-lib` file, values split at whitespace. Indented lines continue the previous field.
+  """
+  fields: Dict[str, List[str]] = {}
+  field = None
+  with open(filename, encoding='utf-8') as f:
+    for line in f:
+      line = line.split('--', 1)[0].rstrip()
+      if line.strip() == '':
+        continue
+      if not line[0].isspace() and ':' in line:
+        field, _, line = line.partition(':')
+        field = field.strip()
+        fields.setdefault(field, [])
+      if field is not None:
+        fields[field] += line.replace(',', ' ').split()
+  return fields
+
+
+def registered() -> Dict[str, str]:
+  # Libraries listed in Agda's `libraries` file, by name
+  found: Dict[str, str] = {}
+  registry = path.join(agda_dir(), 'libraries')
+  if not path.exists(registry):
+    return found
+  with open(registry, encoding='utf-8') as f:
+    for line in f:
+      location = path.expanduser(line.split('--', 1)[0].strip())
+      if location != '' and path.isfile(location):
+        for name in parse_library(location).get('name', []):
+          found.setdefault(name, location)
+  return found
+
+
+def project_library(srcFile: str) -> Optional[str]:
+  # The `.agda-lib` Agda picks up for a file, in its directory or the nearest one above
+  directory = path.dirname(path.abspath(srcFile))
+  while True:
+    candidates = sorted([f for f in os.listdir(directory) if f.endswith('.agda-lib')])
+    if len(candidates) > 0:
+      return path.join(directory, candidates[0])
+    parent = path.dirname(directory)
+    if parent == directory:
+      return None
+    directory = parent
+
+
+def library_includes(srcFile: str, libraries: List[str] = []) -> List[str]:
+  """Include directories of the libraries a file is checked with, its own and the ones named, and their dependencies.
+  """
+  known = registered()
+  todo = [known[n] for n in libraries if n in known]
+  own = project_library(srcFile)
+  if own is not None:
+    todo.append(own)
+
+  includes: List[str] = []
+  seen = set()
+  while len(todo) > 0:
+    location = todo.pop()
+    if location in seen:
+      continue
+    seen.add(location)
+    fields = parse_library(location)
+    includes += [path.join(path.dirname(location), i) for i in fields.get('include', [])]
+    todo += [known[d] for d in fields.get('depend', []) if d in known]
+  return includes
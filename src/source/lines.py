@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import mmap
+import os
+from array import array
+from functools import lru_cache
+from typing import *
+
+
+class LineIndex:
+  """Offsets of the starts of a file's lines, counted in Unicode code points like Agda's positions.
+
+  Agda positions are 1-based: the first character of a file is at offset 1, line 1, column 1. Offsets of a line and
+  column are computed in O(1), lines and columns of an offset in O(log n).
+  """
+  def __init__(self: Any, starts: array, length: int):
+    self.starts = starts
+    self.length = length
+
+  def __len__(self: Any) -> int:
+    return len(self.starts)
+
+  @staticmethod
+  def parse(data: Union[bytes, mmap.mmap]) -> 'LineIndex':
+    starts = array('q', [0])
+    start = 0
+    offset = 0
+    while True:
+      end = data.find(b'\n', start)
+      line = data[start:end if end != -1 else len(data)]
+      # Most lines are ASCII, where bytes are code points
+      offset += len(line) if line.isascii() else len(line.decode('utf-8', errors='replace'))
+      if end == -1:
+        return LineIndex(starts, offset)
+      offset += 1
+      starts.append(offset)
+      start = end + 1
+
+  def offset(self: Any, line: int, column: int) -> int:
+    assert 1 <= line <= len(self.starts), f'Line {line} is not in the file'
+    return self.starts[line - 1] + column
+
+  def position(self: Any, offset: int) -> Tuple[int, int]:
+    line = bisect.bisect_right(self.starts, offset - 1)
+    return line, offset - self.starts[line - 1]
+
+
+@lru_cache(maxsize=256)
+def _line_index(srcFile: str, mtime: int, size: int) -> LineIndex:
+  if size == 0:
+    return LineIndex(array('q', [0]), 0)
+  with open(srcFile, 'rb') as f:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+      return LineIndex.parse(data)
+
+
+def line_index(srcFile: str) -> LineIndex:
+  # Files are read again only when they changed
+  stat = os.stat(srcFile)
+  return _line_index(os.path.abspath(srcFile), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from typing import *
+
+extensions: List[str] = ['.lagda.tex', '.lagda.rst', '.lagda.md', '.lagda.org', '.lagda', '.agda']
+
+FENCES: Dict[str, Tuple[Pattern, Pattern]] = {
+  '.lagda.tex': (re.compile(r'^\s*\\begin\{code\}'), re.compile(r'^\s*\\end\{code\}')),
+  '.lagda': (re.compile(r'^\s*\\begin\{code\}'), re.compile(r'^\s*\\end\{code\}')),
+  '.lagda.org': (re.compile(r'^\s*#\+begin_src agda2', re.I), re.compile(r'^\s*#\+end_src', re.I)),
+}
+FENCE = re.compile(r'^\s*```\s*(\S*)\s*$')
+
+
+def extension(filename: str) -> str:
+  for ext in extensions:
+    if filename.endswith(ext):
+      return ext
+  return ''
+
+
+def _blank(line: str) -> str:
+  return re.sub(r'[^\n]', ' ', line)
+
+
+def illiterate(text: str, filename: str) -> str:
+  # Like Agda, replace everything outside of code blocks by spaces so that offsets, lines and columns stay the same
+  ext = extension(filename)
+  if ext in ['.agda', '']:
+    return text
+
+  lines = text.splitlines(keepends=True)
+  code = False
+  out = []
+
+  if ext == '.lagda.rst':
+    # Code follows a line ending in `::` and lasts as long as it is indented (or blank)
+    for line in lines:
+      if code and line.strip() != '' and not line[0].isspace():
+        code = False
+      out.append(line if code else _blank(line))
+      if not code and line.rstrip().endswith('::'):
+        code = True
+    return ''.join(out)
+
+  if ext == '.lagda.md':
+    # Any fence opens a block, but only unlabelled and `agda` blocks contain code
+    fenced = False
+    for line in lines:
+      fence = FENCE.match(line)
+      if fence is not None:
+        code = not fenced and fence.group(1) in ['', 'agda']
+        fenced = not fenced
+        out.append(_blank(line))
+      else:
+        out.append(line if code else _blank(line))
+    return ''.join(out)
+
+  begin, end = FENCES[ext]
+  for line in lines:
+    if code and end.match(line):
+      code = False
+      out.append(_blank(line))
+    elif not code and begin.match(line):
+      code = True
+      out.append(_blank(line))
+    else:
+      out.append(line if code else _blank(line))
+  return ''.join(out)
@@ -2,5 +2,6 @@
 # -*- coding: utf-8 -*-
 
 from .emojis import *
+from .history import *
 from .log import *
 from .util import *
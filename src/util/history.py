@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect
+import datetime
+import os
+from itertools import islice
+from typing import *
+from typing import IO
+
+from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.document import Document
+from prompt_toolkit.history import History
+
+BLOCK = 65536
+PREFIX = 8
+
+
+def reversed_lines(f: IO[bytes], block: int = BLOCK) -> Iterator[bytes]:
+  # Lines of a file from the last one backwards, reading only as much of the file as is consumed
+  f.seek(0, os.SEEK_END)
+  position = f.tell()
+  rest = b''
+  while position > 0:
+    step = min(block, position)
+    position -= step
+    f.seek(position)
+    lines = (f.read(step) + rest).split(b'\n')
+    rest = lines[0]
+    yield from reversed(lines[1:])
+  yield rest
+
+
+class PrefixIndex:
+  """The most recent history line for a prefix.
+
+  Short prefixes, which match many lines, are answered from a table filled in when lines are added. Longer ones are
+  looked up by bisecting the sorted lines, where few lines share the prefix.
+  """
+  def __init__(self: Any):
+    self.recency: Dict[str, int] = {}
+    self.lines: List[str] = []
+    self.prefixes: Dict[str, Tuple[int, str]] = {}
+
+  def add(self: Any, line: str, stamp: int):
+    if line.strip() == '' or self.recency.get(line, stamp - 1) >= stamp:
+      return
+    if line not in self.recency:
+      bisect.insort(self.lines, line)
+    self.recency[line] = stamp
+
+    for n in range(1, min(len(line), PREFIX) + 1):
+      if self.prefixes.get(line[:n], (stamp - 1, ''))[0] < stamp:
+        self.prefixes[line[:n]] = (stamp, line)
+
+  def find(self: Any, prefix: str) -> Optional[str]:
+    if len(prefix) <= PREFIX:
+      return self.prefixes.get(prefix, (0, None))[1]
+
+    best: Optional[str] = None
+    i = bisect.bisect_left(self.lines, prefix)
+    while i < len(self.lines) and self.lines[i].startswith(prefix):
+      if best is None or self.recency[self.lines[i]] > self.recency[best]:
+        best = self.lines[i]
+      i += 1
+    return best
+
+
+class BoundedHistory(History):
+  """REPL history in the file format of prompt_toolkit's `FileHistory`, bounded in memory and on disk.
+
+  Only the newest `size` entries are loaded, reading the file backwards from its end. Once the file grows past
+  `limit` bytes it is cut down to the newest half. Lines are indexed by prefix for `HistorySuggest`.
+  """
+  def __init__(self: Any, filename: str, size: int = 1000, limit: int = 1 << 20):
+    super(BoundedHistory, self).__init__()
+    self.filename = filename
+    self.size = size
+    self.limit = limit
+    self.index = PrefixIndex()
+    self._oldest = 0
+    self._newest = 0
+
+  def entries(self: Any) -> Iterator[str]:
+    # Newest first, multi-line entries are stored as consecutive `+` lines
+    if not os.path.exists(self.filename):
+      return
+    with open(self.filename, 'rb') as f:
+      lines: List[str] = []
+      for line in reversed_lines(f):
+        if line.startswith(b'+'):
+          lines.append(line[1:].decode('utf-8', errors='replace'))
+        elif len(lines) > 0:
+          yield '\n'.join(reversed(lines))
+          lines = []
+      if len(lines) > 0:
+        yield '\n'.join(reversed(lines))
+
+  def load_history_strings(self: Any) -> Iterable[str]:
+    for entry in islice(self.entries(), self.size):
+      self._oldest -= 1
+      for line in entry.splitlines():
+        self.index.add(line, self._oldest)
+      yield entry
+
+  def append_string(self: Any, string: str):
+    super(BoundedHistory, self).append_string(string)
+    del self._loaded_strings[self.size:]
+
+    self._newest += 1
+    for line in string.splitlines():
+      self.index.add(line, self._newest)
+
+  def store_string(self: Any, string: str):
+    with open(self.filename, 'ab') as f:
+      f.write(f'\n# {datetime.datetime.now()}\n'.encode('utf-8'))
+      for line in string.split('\n'):
+        f.write(f'+{line}\n'.encode('utf-8'))
+
+    if os.path.getsize(self.filename) > self.limit:
+      self.compact()
+
+  def compact(self: Any):
+    # Keep the newest half of the file, starting at an entry's timestamp so that no entry is cut
+    with open(self.filename, 'rb') as f:
+      f.seek(-(self.limit // 2), os.SEEK_END)
+      tail = f.read()
+    start = tail.find(b'\n#')
+    if start == -1:
+      return
+
+    with open(self.filename + '.tmp', 'wb') as f:
+      f.write(tail[start:])
+    os.replace(self.filename + '.tmp', self.filename)
+
+  def suggest(self: Any, text: str) -> Optional[str]:
+    return self.index.find(text)
+
+
+class HistorySuggest(AutoSuggest):
+  """Suggests the most recent history line starting with the text typed so far, like `AutoSuggestFromHistory`.
+  """
+  def get_suggestion(self: Any, buffer: Buffer, document: Document) -> Optional[Suggestion]:
+    if not isinstance(buffer.history, BoundedHistory):
+      return None
+
+    text = document.text.rsplit('\n', 1)[-1]
+    if text.strip() != '':
+      line = buffer.history.suggest(text)
+      if line is not None:
+        return Suggestion(line[len(text):])
+    return None
@@ -5,6 +5,7 @@ import os
 import subprocess
 import tarfile
 import urllib.request
+from functools import lru_cache
 from typing import *
 
 from tqdm import tqdm
@@ -61,3 +62,11 @@ def module_name_from_file_name(filename):
     if ext in filename:
       return filename.replace(ext, '')
   return filename
+
+
+@lru_cache(maxsize=None)
+def agda_version(agda: str = 'agda') -> str:
+  try:
+    return subprocess.run([agda, '--numeric-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+  except Exception as e:
+    return ''
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Throughput of the IOTCM builders, run with `PYTHONPATH=src python test/bench_commands.py`.
+
+`legacy` builds `goal_type_context` the way every builder did before they were generated from `COMMANDS`:
+validation against a list, `str.format` for the command and again for the `IOTCM` wrapper.
+"""
+
+import sys
+import timeit
+sys.path.insert(0, '.')
+
+from src.commands import *
+
+FILE = './test/test.agda'
+N = 200000
+
+
+def legacy(history: List[str], rewrite: str = 'Simplified', interactionId: int = 0, where: Range = Range(), expr: str = '') -> str:
+  assert rewrite in rewriteModes, \
+      rewrite + ' should be on of ' + ', '.join(rewriteModes)
+  expr = expr if expr != '' else FILE
+
+  command = 'Cmd_goal_type_context {rewrite} {interactionId} {where} "{src}"'.format(rewrite=rewrite,
+                                                                                     interactionId=interactionId,
+                                                                                     where=where(),
+                                                                                     src=expr)
+  history.append(command)
+  return 'IOTCM "{srcFile}" NonInteractive Indirect ({command})'.format(srcFile=FILE, command=command)
+
+
+def main():
+  c = Commands(FILE)
+  history: List[str] = []
+  noRange = Range()
+  assert legacy(history, 'Normalised', 3, noRange, 'x') == c.goal_type_context('Normalised', 3, noRange, 'x')
+
+  cases = [
+    ('legacy goal_type_context', lambda: legacy(history, 'Normalised', 3, noRange, 'x')),
+    ('goal_type_context', lambda: c.goal_type_context('Normalised', 3, noRange, 'x')),
+    ('compute_toplevel', lambda: c.compute_toplevel('DefaultCompute', 'x')),
+    ('metas', lambda: c.metas()),
+  ]
+  for name, case in cases:
+    seconds = min(timeit.repeat(case, number=N, repeat=3))
+    print(f'{name:28} {N / seconds / 1e6:6.2f} M commands/s')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+
+
+@pytest.fixture
+def fake_agda(tmp_path, monkeypatch):
+  """Writes a fake `agda` executable, the tests give the Python script that answers like Agda would.
+
+  With `on_path` the directory of the script is put in front of `PATH`, for code which runs plain `agda`.
+  """
+  def write(script: str, directory=None, on_path: bool = False) -> str:
+    directory = directory if directory is not None else tmp_path
+    directory.mkdir(parents=True, exist_ok=True)
+    fake = directory / 'agda'
+    fake.write_text(script)
+    fake.chmod(0o755)
+    if on_path:
+      monkeypatch.setenv('PATH', str(directory) + os.pathsep + os.environ['PATH'])
+    return str(fake)
+
+  return write
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from click.testing import CliRunner
+
+import src.args.agda as cli
+from src.args.agda import agda
+
+# Answers every command with a status and the file and command it was sent, errors for expressions containing `bad`
+AGDA = r"""#!/usr/bin/env python3
+import json, sys
+if '--interaction-json' not in sys.argv:
+  sys.exit(0)
+def respond(r):
+  sys.stdout.write(json.dumps(r) + '\n')
+sys.stdout.write('JSON> ')
+sys.stdout.flush()
+for line in sys.stdin:
+  respond({'kind': 'Status', 'status': {'checked': False, 'showImplicitArguments': False, 'showIrrelevantArguments': False}})
+  if 'Cmd_load' in line:
+    respond({'kind': 'InteractionPoints', 'interactionPoints': [{'id': 0, 'range': []}, {'id': 1, 'range': []}]})
+  elif 'bad' in line:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'Error', 'error': {'message': 'Not in scope: bad'}}})
+  else:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'NormalForm', 'expr': line.split('"')[1] + ' ' + line.strip()[line.index('Indirect (') + 10:-1]}})
+  sys.stdout.write('JSON> ')
+  sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def files(fake_agda, tmp_path):
+  fake_agda(AGDA, on_path=True)
+  found = []
+  for name in ['A', 'B']:
+    f = tmp_path / f'{name}.agda'
+    f.write_text(f'module {name} where\n')
+    found.append(str(f))
+  return found
+
+
+def run(*args):
+  return CliRunner().invoke(agda, ['-o', 'json', '--no-cache'] + list(args))
+
+
+def test_chain(files):
+  a, b = files
+  result = run('load', '-f', a, 'compute_toplevel', '-e', 'one', 'compute_toplevel', '-f', b, '-e', 'two', 'infer_toplevel', '-e', 'three')
+  assert result.exit_code == 0, result.output
+
+  rows = json.loads(result.output)
+  assert [(r['command'], r['file'], r['ok']) for r in rows] == [('load', a, True), ('compute_toplevel', a, True), ('compute_toplevel', b, True), ('infer_toplevel', b, True)]
+  # Commands without --file go to the file given before them
+  assert [r['output'] for r in rows[1:]] == [
+    f'{a} Cmd_compute_toplevel DefaultCompute "one"',
+    f'{b} Cmd_compute_toplevel DefaultCompute "two"',
+    f'{b} Cmd_infer_toplevel Simplified "three"',
+  ]
+  assert all([r['latency'] > 0 for r in rows])
+
+
+def test_chain_failure(files):
+  result = run('load', '-f', files[0], 'compute_toplevel', '-e', 'bad', 'show_version')
+  assert result.exit_code == 1
+  assert [r['ok'] for r in json.loads(result.output)] == [True, False, True]
+
+
+def test_chain_table(files):
+  result = CliRunner().invoke(agda, ['--no-cache', 'load', '-f', files[0]])
+  assert result.exit_code == 0
+  assert 'Latency (ms)' in result.output and 'load' in result.output
+
+
+def test_chain_needs_file(files):
+  assert run('show_version').exit_code == 2
+
+
+@pytest.mark.parametrize('args, command', [
+  (['show_module_contents_toplevel', '-e', 'M'], 'Cmd_show_module_contents_toplevel Simplified "M"'),
+  (['search_about_toplevel', '-r', 'Normalised', '-e', 'x'], 'Cmd_search_about_toplevel Normalised "x"'),
+  (['solveAll'], 'Cmd_solveAll Simplified'),
+  (['auto', '-i', '1'], 'Cmd_auto 1 noRange ""'),
+  (['give', '-i', '1', '-e', 'x', '--force', 'WithForce'], 'Cmd_give WithForce 1 noRange "x"'),
+  (['give'], 'Cmd_give WithoutForce 0 noRange "{f}"'),
+  (['refine', '-e', 'suc'], 'Cmd_refine 0 noRange "suc"'),
+  (['intro', '--whether', '-w', '(1, 2)'], 'Cmd_intro True 0 (intervalsToRange (Just (mkAbsolute "{f}")) [Interval  (Pn () 1 1 1 ) (Pn () 2 1 2 ) ]) "{f}"'),
+  (['refine_or_intro', '-e', 'x'], 'Cmd_refine_or_intro False 0 noRange "x"'),
+  (['compile'], 'Cmd_compile GHCNoMain "{f}" []'),
+  (['compile', '-b', 'LaTeX', '-c', 'a,b'], 'Cmd_compile LaTeX "{f}" ["a","b"]'),
+  (['tokenHighlighting'], 'Cmd_tokenHighlighting "{f}" Keep'),
+])
+def test_chain_commands(files, args, command):
+  result = run('load', '-f', files[0], *args)
+  assert result.exit_code == 0, result.output
+  assert json.loads(result.output)[1]['output'] == f'{files[0]} ' + command.format(f=files[0])
+
+
+@pytest.mark.parametrize('args', [['compile', '-b', 'Java'], ['compute_toplevel', '-c', 'Fast'], ['tokenHighlighting', '-r', 'Drop'], ['give', '-w', '(1, 99)']])
+def test_chain_bad_parameter(files, args):
+  result = run('load', '-f', files[0], *args)
+  assert result.exit_code == 2
+  assert result.exception is None or isinstance(result.exception, SystemExit)
+
+
+def test_chain_cache(files, tmp_path, monkeypatch):
+  caches = []
+
+  def cache(**kwargs):
+    caches.append(QueryCache(root=str(tmp_path / 'queries'), **kwargs))
+    return caches[-1]
+
+  QueryCache = cli.QueryCache
+  monkeypatch.setattr(cli, 'QueryCache', cache)
+  queries = [['show_module_contents_toplevel', '-e', 'M'], ['search_about_toplevel', '-e', 'x'], ['why_in_scope_toplevel', '-e', 'y']]
+  result = CliRunner().invoke(agda, ['-o', 'json', 'load', '-f', files[0]] + sum(queries, []) + sum(queries, []))
+  assert result.exit_code == 0, result.output
+
+  # The second time around every query is answered from the cache
+  rows = json.loads(result.output)
+  assert (caches[0].hits, caches[0].misses) == (3, 3)
+  assert [r['output'] for r in rows[1:4]] == [r['output'] for r in rows[4:]]
+
+
+def test_goals(files):
+  result = run('goals', '-f', files[0], 'show_version')
+  assert result.exit_code == 0, result.output
+
+  rows = json.loads(result.output)
+  assert [(r['command'], r['interactionId']) for r in rows] == [('load', None), ('goal_type_context', 0), ('goal_type_context', 1), ('show_version', None)]
+  assert [r['output'] for r in rows[1:3]] == [f'{files[0]} Cmd_goal_type_context Simplified {i} noRange "{files[0]}"' for i in [0, 1]]
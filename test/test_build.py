@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.packages.project.build import *
+
+# Records the order in which modules are checked and what the first one imports, fails the ones named Bad
+AGDA = '''#!/usr/bin/env python3
+import sys
+text = open(sys.argv[-1]).read()
+with open(sys.argv[0] + '.log', 'a') as log:
+  log.write(text.split()[1] + ('' if 'ReflLibraries' not in text else ' ' + ' '.join(text.split()[4::2])) + '\\n')
+open(sys.argv[-1] + '.checked', 'w').write('')
+sys.exit(1 if 'Bad' in sys.argv[-1] else 0)
+'''
+
+
+def project(fake_agda, tmp_path, modules):
+  src = tmp_path / 'src'
+  for name, imported in modules.items():
+    f = src.joinpath(*name.split('.')).with_suffix('.agda')
+    f.parent.mkdir(parents=True, exist_ok=True)
+    f.write_text(f'module {name} where\n' + ''.join([f'open import {i}\n' for i in imported]))
+  return Build([str(src)], jobs=2, agda=fake_agda(AGDA, tmp_path))
+
+
+def test_build_graph(fake_agda, tmp_path):
+  build = project(fake_agda, tmp_path, {'A': [], 'B.C': ['A', 'Data.Nat'], 'D': ['B.C', 'A']})
+  modules = build.modules()
+  assert sorted(modules) == ['A', 'B.C', 'D']
+  assert build.graph(modules) == {'A': set(), 'B.C': {'A'}, 'D': {'A', 'B.C'}}
+  assert build.libraries(modules) == ['Data.Nat']
+
+
+def test_build(fake_agda, tmp_path):
+  build = project(fake_agda, tmp_path, {'A': [], 'B': ['A'], 'C': ['A'], 'Bad': ['A'], 'D': ['B', 'Bad'], 'E': ['D'], 'X': ['Y'], 'Y': ['X']})
+  results = {r.module: r.status for r in build(progress=False)}
+  assert results == {'A': OK, 'B': OK, 'C': OK, 'Bad': FAILED, 'D': SKIPPED, 'E': SKIPPED, 'X': FAILED, 'Y': FAILED}
+
+  checked = lambda m: os.path.exists(str(tmp_path / 'src' / m) + '.agda.checked')
+  assert set([m for m in results if checked(m)]) == {'A', 'B', 'C', 'Bad'}
+
+
+def test_build_libraries(fake_agda, tmp_path):
+  build = project(fake_agda, tmp_path, {'A': ['Data.Nat'], 'B': ['A', 'Data.List', 'Data.Nat']})
+  assert [r.status for r in build(progress=False)] == [OK, OK]
+  # The library modules are checked on their own before any module of the project
+  assert (tmp_path / 'agda.log').read_text().splitlines() == ['ReflLibraries Data.List Data.Nat', 'A', 'B']
+
+  (tmp_path / 'agda.log').unlink()
+  build = project(fake_agda, tmp_path / 'local', {'A': [], 'B': ['A']})
+  build(progress=False)
+  assert (tmp_path / 'local' / 'agda.log').read_text().splitlines() == ['A', 'B']
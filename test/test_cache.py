@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.interaction.cache import *
+
+normal = {'kind': 'DisplayInfo', 'info': {'kind': 'NormalForm', 'expr': '4'}}
+running = {'kind': 'RunningInfo', 'debugLevel': 1, 'message': 'Checking'}
+query = 'IOTCM "{}" None Indirect (Cmd_compute_toplevel DefaultCompute "2 + 2")'
+
+
+def test_query_cache(tmp_path):
+  f = str(tmp_path / 'A.agda')
+  open(f, 'w').write('module A where\n')
+  cache = QueryCache(root=str(tmp_path / 'queries'))
+
+  cache.load(f)
+  key = cache.key(f, query.format(f))
+  assert cache.get(key) is None
+  cache.put(key, [parse_response(running), parse_response(normal)])
+  assert [r.data for r in cache.get(key)] == [normal]
+  assert (cache.hits, cache.misses) == (1, 1)
+
+  # The path of the file does not matter, its contents and the query do
+  assert cache.key(f, query.format('./' + f)) == key
+  assert cache.key(f, query.format(f).replace('2 + 2', '2 + 3')) != key
+  open(f, 'w').write('module A where\nx = 1\n')
+  assert cache.key(f, query.format(f)) == key
+  cache.load(f)
+  assert cache.key(f, query.format(f)) != key
+
+
+def test_query_cache_closure(tmp_path, monkeypatch):
+  monkeypatch.setenv('AGDA_DIR', str(tmp_path / 'agda'))
+  files = {
+    'src/Foo/Bar.agda': 'module Foo.Bar where\nopen import Foo.Baz\nimport Lib\nimport Dep\n',
+    'src/Foo/Baz.agda': 'module Foo.Baz where\nopen import Foo.Qux\n',
+    'src/Foo/Qux.agda': 'module Foo.Qux where\n',
+    'lib/Lib.agda': 'module Lib where\n',
+    'dep/Dep.agda': 'module Dep where\n',
+    'dep/dep.agda-lib': 'name: dep\ninclude: .\n',
+    'agda/libraries': str(tmp_path / 'dep/dep.agda-lib') + '\n',
+  }
+  for name, text in files.items():
+    (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+    (tmp_path / name).write_text(text)
+  f = str(tmp_path / 'src/Foo/Bar.agda')
+  cache = QueryCache(root=str(tmp_path / 'queries'))
+
+  def key():
+    cache.load(f, ['-i', str(tmp_path / 'lib'), '--library=dep'])
+    return cache.key(f, query.format(f))
+
+  # Editing any module of the closure, even ones imported transitively or from a library, changes the key
+  keys = [key()]
+  for name in ['src/Foo/Qux.agda', 'lib/Lib.agda', 'dep/Dep.agda']:
+    (tmp_path / name).write_text(files[name] + 'x = 1\n')
+    keys.append(key())
+  assert len(set(keys)) == 4
+  assert key() == keys[-1]
+
+
+def test_query_cache_evict(tmp_path):
+  f = str(tmp_path / 'A.agda')
+  open(f, 'w').write('module A where\n')
+  cache = QueryCache(root=str(tmp_path / 'queries'), limit=1000)
+  cache.load(f)
+
+  keys = [cache.key(f, query.format(f).replace('2 + 2', str(i))) for i in range(20)]
+  for i, key in enumerate(keys):
+    cache.put(key, [parse_response(normal)])
+    os.utime(cache._entry(key), (i, i))
+    cache.get(keys[0])
+  assert cache.size() <= 1000
+  assert cache.get(keys[0]) is not None
+  assert cache.get(keys[1]) is None
+  assert cache.get(keys[-1]) is not None
@@ -9,7 +9,7 @@ from src.commands import *
 
 def test_range():
   r = range_builder('./test/test.agda', 6, 8, 6, 12)
-  assert r() == '(intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 49 6 8 ) (Pn () 73 6 12 ) ])'
+  assert r() == '(intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 86 6 8 ) (Pn () 90 6 12 ) ])'
 
 def test_compile():
   assert Commands('./test/test.agda').compile('GHC', []) == \
@@ -43,7 +43,7 @@ def test_solveOne():
   r = range_builder('./test/test.agda', 6, 8, 6, 12)
 
   assert Commands('./test/test.agda').solveOne('Normalised', 0, r, 'Agda.Builtin.Nat') == \
-    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_solveOne Normalised 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 49 6 8 ) (Pn () 73 6 12 ) ]) "Agda.Builtin.Nat")'
+    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_solveOne Normalised 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 86 6 8 ) (Pn () 90 6 12 ) ]) "Agda.Builtin.Nat")'
 
 def test_autoAll():
   assert Commands('./test/test.agda').autoAll() == \
@@ -53,7 +53,7 @@ def test_autoOne():
   r = range_builder('./test/test.agda', 6, 8, 6, 12)
 
   assert Commands('./test/test.agda').autoOne(0, r, 'Agda.Builtin.Nat') == \
-    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_autoOne 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 49 6 8 ) (Pn () 73 6 12 ) ]) "Agda.Builtin.Nat")'
+    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_autoOne 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 86 6 8 ) (Pn () 90 6 12 ) ]) "Agda.Builtin.Nat")'
 
 def test_auto():
   r = Range()
@@ -81,7 +81,7 @@ def test_highlight():
   r = range_builder('./test/test.agda', 6, 8, 6, 12)
 
   assert Commands('./test/test.agda').highlight(0, r) == \
-    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_highlight 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 49 6 8 ) (Pn () 73 6 12 ) ]) "./test/test.agda")'
+    'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_highlight 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 86 6 8 ) (Pn () 90 6 12 ) ]) "./test/test.agda")'
 
 def test_give():
   assert Commands('./test/test.agda').give('WithoutForce', 0, Range(), 'proof₁') == \
@@ -158,3 +158,57 @@ def test_show_version():
 def test_abort():
   assert Commands('./test/test.agda').abort() == \
     'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_abort)'
+
+def test_history():
+  c = Commands('./test/test.agda', history=3)
+  c.load([])
+  c.goal_type_context('Simplified', 2, Range(), 'x' * 100)
+  c.metas()
+  c.show_version()
+
+  assert [r.kind for r in c.history] == ['Cmd_goal_type_context', 'Cmd_metas', 'Cmd_show_version']
+  assert c.history[0].interactionId == 2
+  assert c.history[0].args == ('Simplified', 'x' * 64 + '…')
+  assert c.history.last.latency is None
+
+def test_history_export():
+  import io, json
+  c = Commands('./test/test.agda')
+  c.compile('GHC', ['a'])
+  c.history.last.latency = 0.5
+
+  f = io.StringIO()
+  c.history.export(f)
+  assert [json.loads(l) for l in f.getvalue().splitlines()] == \
+    [{'kind': 'Cmd_compile', 'interactionId': None, 'args': ['GHC', ['a']], 'sent': None, 'latency': 0.5}]
+
+def test_batch():
+  c = Commands('./test/test.agda')
+  with c.batch() as b:
+    c.metas()
+    c.compute_toplevel('DefaultCompute', '1 + 1')
+  c.show_version()
+
+  assert len(b) == 2
+  assert b.buffer == (c.wrap('Cmd_metas') + '\n' + c.wrap_global('Cmd_compute_toplevel DefaultCompute "1 + 1"') + '\n').encode('utf-8')
+  assert [r.kind for r in b.records] == ['Cmd_metas', 'Cmd_compute_toplevel']
+
+def test_range_parser():
+  assert range_parser('./test/test.agda', '((6,8),(6,12))')() == range_builder('./test/test.agda', 6, 8, 6, 12)()
+  assert range_parser('./test/test.agda', '')() == 'noRange'
+  assert range_parser('./test/test.agda', '[ (10, 12), ((3, 1), (3, 2)) ]')() == \
+    '(intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () 3 3 1 ) (Pn () 4 3 2 ), Interval  (Pn () 10 3 8 ) (Pn () 12 3 10 ) ])'
+
+def test_range_parser_invalid():
+  assert not range_parser_validator('[(1,2)')
+  assert not range_parser_validator('((1,2),(3))')
+  with pytest.raises(ValueError):
+    range_parser('./test/test.agda', '(5, 2)')
+  with pytest.raises(ValueError):
+    range_parser('./test/test.agda', '((100, 1), (100, 2))')
+
+def test_holes():
+  c = Commands('./test/test.agda')
+  hole, = c.holes()
+  assert (hole.id, hole.line, hole.column) == (0, 12, 10)
+  assert c.goal_type('Simplified', hole.id, hole.where, '') == f'IOTCM "./test/test.agda" NonInteractive Indirect (Cmd_goal_type Simplified 0 (intervalsToRange (Just (mkAbsolute "./test/test.agda")) [Interval  (Pn () {hole.start} 12 10 ) (Pn () {hole.end} 12 11 ) ]) "./test/test.agda")'
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.interaction.highlighting import *
+
+
+def info(payload, remove=False):
+  return {'kind': 'HighlightingInfo', 'direct': True, 'info': {'remove': remove, 'payload': payload}}
+
+
+def item(start, end, atoms, site=None, token=False):
+  return {'range': [[start, end]], 'atoms': atoms, 'tokenBased': 'TokenBased' if token else 'NotOnlyTokenBased', 'note': '', 'definitionSite': site}
+
+
+def test_highlighting():
+  site = {'filepath': '/A.agda', 'position': 3}
+  h = Highlighting()
+  h.add(HighlightingInfo(info([item(i, i + 1, ['keyword'], token=True) for i in range(1, 4000, 2)])))
+  h.add(HighlightingInfo(info([item(20, 30, ['function'], site), item(40, 41, ['function'], site)])))
+  assert len(h) == 2002
+  assert len(h.kinds) == 2 and len(h.sites) == 2
+
+  assert h.at(2) == []
+  assert h.at(3) == [(3, 4, ('keyword', ), None)]
+  assert h.at(25) == [(20, 30, ('function', ), ('/A.agda', 3)), (25, 26, ('keyword', ), None)]
+  assert [r[0] for r in h.within(28, 35)] == [20, 29, 31, 33]
+
+  # Removing drops the token-based ranges only, the ones from type checking stay
+  h.add(HighlightingInfo(info([item(1, 5, ['comment'], token=True)], remove=True)))
+  functions = [(20, 30, ('function', ), ('/A.agda', 3)), (40, 41, ('function', ), ('/A.agda', 3))]
+  assert h.within(0, 4000) == [(1, 5, ('comment', ), None)] + functions
+
+  h.add(ClearHighlighting({'kind': 'ClearHighlighting', 'tokenBased': 'TokenBased'}))
+  assert h.within(0, 4000) == functions
+  h = Highlighting.of([HighlightingInfo(info([item(1, 5, ['comment'])])), ClearHighlighting({'kind': 'ClearHighlighting', 'tokenBased': 'NotOnlyTokenBased'})])
+  assert len(h) == 0
+
+
+def test_highlighting_indirect(tmp_path):
+  f = str(tmp_path / 'highlighting.json')
+  json.dump(info([item(1, 7, ['keyword'], token=True)])['info'], open(f, 'w'))
+  h = Highlighting.of([HighlightingInfo({'kind': 'HighlightingInfo', 'direct': False, 'filepath': f})])
+  assert h.at(6) == [(1, 7, ('keyword', ), None)]
+
+  # Pretty printed, with other keys, replacing the token-based ranges, and with an empty payload
+  json.dump({'remove': True, 'payload': [item(i, i + 2, ['comment'], {'filepath': '/A.agda', 'position': i}) for i in range(1, 9, 3)], 'x': [1]}, open(f, 'w'), indent=2)
+  h.add(HighlightingInfo({'kind': 'HighlightingInfo', 'direct': False, 'filepath': f}))
+  assert [r[:2] for r in h.within(0, 10)] == [(1, 3), (4, 6), (7, 9)]
+  json.dump({'remove': False, 'payload': []}, open(f, 'w'))
+  h.add(HighlightingInfo({'kind': 'HighlightingInfo', 'direct': False, 'filepath': f}))
+  assert len(h) == 3
+
+  open(f, 'w').write('{"remove": false, "payload": [{}')
+  with pytest.raises(ValueError):
+    h.add(HighlightingInfo({'kind': 'HighlightingInfo', 'direct': False, 'filepath': f}))
+
+
+def test_highlighting_within():
+  # A long comment up front, then short ranges, some of them added out of order after lookups
+  items = [item(1, 10000, ['comment'])] + [item(i, i + 3, ['symbol']) for i in range(10000, 20000, 4)]
+  h = Highlighting.of([HighlightingInfo(info(items[:1000]))])
+  brute = lambda start, end: sorted([(r[0][0], r[0][1]) for r in [i['range'] for i in items[:len(h)]] if r[0][0] < end and r[0][1] > start])
+  for start, end in [(0, 1), (5, 6), (9999, 10001), (10002, 10006), (13000, 13100)]:
+    assert [r[:2] for r in h.within(start, end)] == brute(start, end)
+
+  h.add(HighlightingInfo(info(items[2000:] + items[1000:2000])))
+  assert [r[:2] for r in h.within(13990, 14010)] == brute(13990, 14010)
+  assert [r[:2] for r in h.within(19990, 30000)] == brute(19990, 30000)
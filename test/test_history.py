@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.util.history import *
+
+def fill(filename, n):
+  h = BoundedHistory(filename, limit=1 << 30)
+  for i in range(n):
+    h.store_string(f'x{i} = {i}')
+  return h
+
+def test_newest_first(tmp_path):
+  filename = str(tmp_path / 'history')
+  fill(filename, 5000)
+  h = BoundedHistory(filename, size=10, limit=1 << 30)
+  loaded = list(h.load_history_strings())
+  assert loaded == [f'x{i} = {i}' for i in range(4999, 4989, -1)]
+
+def test_multiline(tmp_path):
+  filename = str(tmp_path / 'history')
+  h = BoundedHistory(filename)
+  h.store_string('f : Nat\n  -- more')
+  h.store_string('f = 1')
+  assert list(BoundedHistory(filename).load_history_strings()) == ['f = 1', 'f : Nat\n  -- more']
+
+def test_compact(tmp_path):
+  filename = str(tmp_path / 'history')
+  fill(filename, 2000)
+  h = BoundedHistory(filename, limit=4096)
+  h.store_string('last')
+  assert os.path.getsize(filename) <= 4096
+  loaded = list(h.load_history_strings())
+  assert loaded[0] == 'last' and loaded[1] == 'x1999 = 1999'
+  assert all([e.startswith('x') or e == 'last' for e in loaded])
+
+def test_suggest(tmp_path):
+  filename = str(tmp_path / 'history')
+  h = BoundedHistory(filename)
+  h.store_string('open import Data.Nat.Properties')
+  h.store_string('open import Data.Nat')
+  list(h.load_history_strings())
+  assert h.suggest('open') == 'open import Data.Nat'
+  assert h.suggest('open import Data.Nat.') == 'open import Data.Nat.Properties'
+
+  h.append_string('open import Data.List')
+  assert h.suggest('op') == 'open import Data.List'
+  assert h.suggest('open import Data.') == 'open import Data.List'
+  assert h.suggest('close') is None
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+import json
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from prompt_toolkit.document import Document
+
+from src.commands import Commands
+from src.interpret import *
+
+# Loads files and answers queries with the command it was sent, errors for files or queries containing `bad`
+AGDA = r"""#!/usr/bin/env python3
+import json, sys
+if '--interaction-json' not in sys.argv:
+  sys.exit(0)
+def respond(r):
+  sys.stdout.write(json.dumps(r) + '\n')
+sys.stdout.write('JSON> ')
+sys.stdout.flush()
+for line in sys.stdin:
+  if 'Cmd_abort' in line:
+    continue
+  respond({'kind': 'Status', 'status': {'checked': False, 'showImplicitArguments': False, 'showIrrelevantArguments': False}})
+  if 'Cmd_load' in line and 'bad' in open(line.split('"')[3]).read():
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'Error', 'error': {'message': 'Not in scope: bad'}}})
+  elif 'Cmd_load' in line:
+    respond({'kind': 'InteractionPoints', 'interactionPoints': []})
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'AllGoalsWarnings', 'visibleGoals': [], 'invisibleGoals': [], 'warnings': [], 'errors': []}})
+  elif 'bad' in line:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'Error', 'error': {'message': 'Not in scope: bad'}}})
+  else:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'NormalForm', 'expr': line.strip()[line.index('Indirect (') + 10:-1]}})
+  sys.stdout.write('JSON> ')
+  sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def agda(fake_agda):
+  return fake_agda(AGDA, on_path=True)
+
+
+def script(tmp_path, lines):
+  f = tmp_path / 'script.refl'
+  f.write_text('\n'.join(lines) + '\n')
+  return Repl({'script': str(f)})
+
+
+def test_is_declaration():
+  for code in ['x : Nat', 'x = 1', 'f (suc n) = n', 'open import Data.Nat', 'data D : Set where', '{-# BUILTIN NATURAL Nat #-}', '-- note']:
+    assert is_declaration(code), code
+  for code in ['1 + 1', 'f x', 'let x = 1 in x', 'λ x → x', 'record { a = 1 }', '(x : Nat) → Nat', '{x = 1}']:
+    assert not is_declaration(code), code
+
+
+def test_script_inputs():
+  script = '\n'.join([
+    'open import Data.Nat',
+    '',
+    'x : ℕ',
+    'x = 1',
+    '1 + x',
+    'data D : Set where',
+    '  a : D',
+    '',
+    '  b : D',
+    'f : D → D',
+    '',
+    'f a = b',
+    ':type x',
+    'y : ℕ',
+  ])
+  assert script_inputs(script) == [
+    (1, 'open import Data.Nat'),
+    (3, 'x : ℕ\nx = 1'),
+    (5, '1 + x'),
+    (6, 'data D : Set where\n  a : D\n  b : D\nf : D → D'),
+    (12, 'f a = b'),
+    (13, ':type x'),
+    (14, 'y : ℕ'),
+  ]
+
+
+def test_batch(agda, tmp_path, capsys):
+  repl = script(tmp_path, ['x : Nat', 'x = 1', '', 'suc x', ':compile Java', ':compute_toplevel Fast x', ':infer_toplevel Normalised x'])
+  assert repl.run() == 1
+
+  rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert [(r['line'], r['input'], r['ok']) for r in rows] == [
+    (1, 'x : Nat\nx = 1', True),
+    (4, 'suc x', True),
+    (5, ':compile Java', False),
+    (6, ':compute_toplevel Fast x', False),
+    (7, ':infer_toplevel Normalised x', True),
+  ]
+  assert rows[1]['output'] == 'Cmd_compute_toplevel DefaultCompute "suc x"'
+  assert rows[2]['output'].startswith('Unknown backend Java')
+  assert rows[3]['output'].startswith('Invalid arguments for :compute_toplevel')
+  assert [r['kind'] for r in rows[0]['responses']] == ['Status', 'InteractionPoints', 'DisplayInfo']
+  assert all([r['time'] > 0 for r in rows[:2]])
+
+
+def test_batch_ok(agda, tmp_path, capsys):
+  assert script(tmp_path, ['x : Nat', 'x = 1', 'x']).run() == 0
+  assert script(tmp_path, ['x = bad']).run() == 1
+  rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert [r['ok'] for r in rows] == [True, True, False]
+  assert rows[-1]['output'] == 'Not in scope: bad'
+
+
+def test_dispatch(agda, tmp_path):
+  f = tmp_path / 'A.agda'
+  f.write_text('module A where\n')
+
+  async def run():
+    repl = script(tmp_path, [])
+    await repl.start()
+    try:
+      results = [
+        await repl.dispatch('goal_type_context', 'Normalised --interactionId 2 --expr "a \\"b\\""'),
+        await repl.dispatch('load', f'--file {f} --cmds -i,x'),
+        repl.agda.loaded,
+        await repl.dispatch('nonsense', ''),
+        await repl.dispatch('infer', '--where "(1, 2'),
+        await repl.dispatch('give', 'Maybe'),
+      ]
+    finally:
+      await repl.stop()
+    return results, repl.messages
+
+  results, messages = asyncio.run(run())
+  assert str(results[0][-1]) == 'Cmd_goal_type_context Normalised 2 noRange "a \\"b\\""'
+  assert [r.kind for r in results[1]] == ['Status', 'InteractionPoints', 'DisplayInfo']
+  assert results[2] == str(f)
+  assert results[3:] == [None, None, None]
+  assert messages[0] == 'Unknown command :nonsense'
+  assert messages[1].startswith('Could not parse arguments')
+  assert messages[2].startswith('Invalid arguments for :give Maybe')
+
+
+def test_coerce(tmp_path):
+  f = tmp_path / 'A.agda'
+  f.write_text('module A where\nx = 1\n')
+  repl = Repl()
+  parameters = {**inspect.signature(Commands.give).parameters, **inspect.signature(Commands.load).parameters, **inspect.signature(Commands.intro).parameters}
+  coerce = lambda name, value: repl.coerce(parameters[name], value, str(f))
+
+  assert coerce('interactionId', '3') == 3
+  assert (coerce('whether', 'True'), coerce('whether', 'no')) == (True, False)
+  assert coerce('cmds', '-i,x,') == ['-i', 'x']
+  assert coerce('expr', 'a "b"') == 'a \\"b\\"'
+  assert coerce('force', 'WithForce') == 'WithForce'
+  assert coerce('where', '(1, 3)').intervals[0].end.position == 3
+  with pytest.raises(ValueError):
+    coerce('interactionId', 'x')
+  with pytest.raises(ValueError):
+    coerce('where', '(1, 99)')
+
+
+def test_scope_completer(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  (tmp_path / 'Nat.agda').write_text('')
+  completer = ScopeCompleter([':load', ':eval'])
+  completer.update('', ['natural', 'Zero'])
+  completer.update('Data.Nat', ['Nat', 'suc'])
+  complete = lambda text: sorted([c.text for c in completer.get_completions(Document(text), None)])
+
+  assert complete('1 + na') == ['Nat', 'Nat.agda', 'natural']
+  assert complete(':e') == [':eval']
+  assert complete('z') == ['Zero']
+
+  # Updating the scratch module keeps the names of imported modules, files are listed again once the directory changed
+  completer.update('', ['zero'])
+  assert complete('z') == ['zero']
+  assert complete('s') == ['suc']
+  (tmp_path / 'Sigma.agda').write_text('')
+  os.utime(tmp_path, (1, 1))
+  assert complete('S') == ['Sigma.agda', 'suc']
+  completer.clear()
+  assert complete('s') == ['Sigma.agda']
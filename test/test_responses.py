@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.interaction.responses import *
+
+status = {'kind': 'Status', 'status': {'checked': True, 'showImplicitArguments': False, 'showIrrelevantArguments': False}}
+error = {'kind': 'DisplayInfo', 'info': {'kind': 'Error', 'error': {'message': 'Not in scope: foo'}, 'warnings': []}}
+goals = {'kind': 'DisplayInfo', 'info': {'kind': 'AllGoalsWarnings', 'visibleGoals': [{'kind': 'OfType', 'constraintObj': {'id': 0}, 'type': 'Nat'}],
+                                         'invisibleGoals': [], 'warnings': [], 'errors': []}}
+highlighting = {'kind': 'HighlightingInfo', 'direct': True,
+                'info': {'remove': False, 'payload': [{'range': [[i, i + 1]], 'atoms': ['keyword']} for i in range(1, 4000, 2)]}}
+
+output = b'JSON> ' + b'\n'.join([json.dumps(r).encode('utf-8') for r in [status, highlighting, goals, error]]) + b'\nJSON> '
+
+
+def test_decode_whole():
+  events = ResponseDecoder().feed(output)
+  assert [type(e) for e in events] == [Prompt, Status, HighlightingInfo, GoalsDisplay, Error, Prompt]
+
+def test_decode_chunked():
+  for size in [1, 5, 7, 4096]:
+    decoder = ResponseDecoder()
+    events = [e for i in range(0, len(output), size) for e in decoder.feed(output[i:i + size])]
+    assert [type(e) for e in events] == [Prompt, Status, HighlightingInfo, GoalsDisplay, Error, Prompt]
+
+def test_decode_prompt_before_newline():
+  decoder = ResponseDecoder()
+  assert [type(e) for e in decoder.feed(b'JSON> {"kind": "Status"}\n')] == [Prompt, Status]
+  assert decoder.feed(b'JSON') == []
+  assert decoder.feed(b'> ') == [PROMPTED]
+  assert decoder.feed(b'JSON> JSON> ') == [PROMPTED, PROMPTED]
+
+def test_decode_stream():
+  events = list(decode(io.BytesIO(output), chunk=3))
+  assert len(events) == 6
+
+def test_typed_responses():
+  events = ResponseDecoder().feed(output)
+  assert events[1].checked
+  assert len(events[2].payload) == 2000
+  assert str(events[3]) == '?0 : Nat'
+  assert events[4].message == 'Not in scope: foo'
+  assert str(events[4]) == 'Not in scope: foo'
+
+def test_old_style_responses():
+  assert parse_response({'kind': 'DisplayInfo', 'info': {'kind': 'Error', 'message': 'oops'}}).message == 'oops'
+  assert parse_response({'kind': 'InteractionPoints', 'interactionPoints': [0, 1]}).ids == [0, 1]
+  assert parse_response({'kind': 'InteractionPoints', 'interactionPoints': [{'id': 3, 'range': []}]}).ids == [3]
+  assert type(parse_response({'kind': 'ClearRunningInfo'})) is Response
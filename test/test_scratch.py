@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.scratch import *
+
+def test_chain(tmp_path):
+  s = Scratch(str(tmp_path), preamble=['import Prelude'])
+  s.add('open import Data.Nat')
+  s.add('x = 1')
+  assert s.seal()
+  s.add('y = x')
+
+  assert s.srcFile == os.path.join(str(tmp_path), 'Scratch1.agda')
+  assert open(s.file(0)).read() == 'module Scratch0 where\n\nimport Prelude\n\nopen import Data.Nat\n\nx = 1\n'
+  assert open(s.file(1)).read() == 'module Scratch1 where\n\nopen import Scratch0 public\n\nimport Prelude\n\nopen import Data.Nat\n\ny = x\n'
+
+def test_seal_empty(tmp_path):
+  s = Scratch(str(tmp_path))
+  assert not s.seal()
+  assert s.head == 0
+
+def test_undo(tmp_path):
+  s = Scratch(str(tmp_path))
+  s.add('x = 1')
+  s.seal()
+  s.add('y = 2')
+
+  assert s.undo()
+  assert s.blocks == [['x = 1'], []]
+  assert s.undo()
+  assert s.blocks == [[]]
+  assert not os.path.exists(os.path.join(str(tmp_path), 'Scratch1.agda'))
+  assert not s.undo()
+
+def test_reset(tmp_path):
+  s = Scratch(str(tmp_path))
+  s.add('x = 1')
+  s.seal()
+  s.reset()
+  assert os.listdir(str(tmp_path)) == ['Scratch0.agda']
+
+def test_snapshot(tmp_path):
+  os.makedirs(str(tmp_path / 'live'))
+  s = Scratch(str(tmp_path / 'live'), preamble=['import Prelude'])
+  s.add('x = 1')
+  s.seal()
+  s.add('y = x')
+  open(s.file(0)[:-len('.agda')] + '.agdai', 'w').write('interface')
+
+  Snapshot('demo', root=str(tmp_path / 'sessions')).save(s, {'prelude': 'Prelude.agda', 'includes': [], 'library': None})
+  r, args = Snapshot('demo', root=str(tmp_path / 'sessions')).load()
+
+  assert args['prelude'] == 'Prelude.agda'
+  assert r.blocks == s.blocks and r.preamble == s.preamble
+  assert r.directory != s.directory
+  assert os.stat(r.file(0)).st_mtime_ns == os.stat(s.file(0)).st_mtime_ns
+  assert open(r.file(1)).read() == open(s.file(1)).read()
+  assert open(r.file(0)[:-len('.agda')] + '.agdai').read() == 'interface'
+
+def test_chain_opens(tmp_path):
+  s = Scratch(str(tmp_path))
+  s.add('import Agda.Builtin.Nat as N')
+  s.add('open N using (Nat)')
+  s.add('open module B = Agda.Builtin.Bool using (Bool)')
+  s.add('module M = N')
+  s.add('x : Nat\nx = 1')
+  assert s.seal()
+
+  assert s.imports(1) == ['import Agda.Builtin.Nat as N', 'open N using (Nat)', 'open B using (Bool)']
+  assert 'open N using (Nat)' in open(s.file(1)).read()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.commands import Commands, Range
+from src.interaction.pool import *
+from src.interaction.session import *
+
+# Answers like `agda --interaction-json` in small pieces, so that responses and prompts are split across reads.
+# With --hold the answers to three commands are written at once, with --log every command is appended to a file.
+AGDA = r"""#!/usr/bin/env python3
+import json, sys
+hold = '--hold' in sys.argv
+log = sys.argv[sys.argv.index('--log') + 1] if '--log' in sys.argv else None
+out = sys.stdout
+pending = []
+
+def write(text):
+  pending.append(text)
+
+def flush(force=False):
+  global pending
+  if hold and not force and pending.count('JSON> ') < 3:
+    return
+  text = ''.join(pending)
+  pending = []
+  for i in range(0, len(text), 7):
+    out.write(text[i:i + 7])
+    out.flush()
+
+def respond(r):
+  write(json.dumps(r) + '\n')
+
+out.write('JSON> ')
+out.flush()
+for line in sys.stdin:
+  if log is not None:
+    open(log, 'a').write(line)
+  if 'Cmd_abort' in line:
+    # The command held back ends with DoneAborting, which Agda also sends when nothing runs
+    aborted = json.dumps({'kind': 'DoneAborting'}) + '\n'
+    pending.insert(pending.index('JSON> ') if 'JSON> ' in pending else len(pending), aborted)
+    flush(True)
+    continue
+  if 'die' in line:
+    sys.exit(3)
+  respond({'kind': 'Status', 'status': {'checked': False, 'showImplicitArguments': False, 'showIrrelevantArguments': False}})
+  if 'Cmd_load' in line:
+    respond({'kind': 'InteractionPoints', 'interactionPoints': [0, 1]})
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'AllGoalsWarnings', 'visibleGoals': [], 'invisibleGoals': [], 'warnings': [], 'errors': []}})
+  elif 'Cmd_goal_type_context' in line:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'GoalSpecific', 'interactionPoint': 0, 'goalInfo': {'kind': 'GoalType', 'type': line.split()[6], 'entries': []}}})
+  else:
+    respond({'kind': 'DisplayInfo', 'info': {'kind': 'NormalForm', 'expr': line.strip()}})
+  write('JSON> ')
+  flush()
+"""
+
+
+@pytest.fixture
+def agda(fake_agda):
+  return fake_agda(AGDA)
+
+
+@pytest.fixture
+def source(tmp_path):
+  f = tmp_path / 'A.agda'
+  f.write_text('module A where\n')
+  return str(f)
+
+
+def test_session(agda, source):
+  with Session(source, agda=agda) as s:
+    responses = s.load([])
+    assert [r.kind for r in responses] == ['Status', 'InteractionPoints', 'DisplayInfo']
+    assert s.loaded == source
+    assert s.commands.history.last.latency > 0
+
+    expr, = [str(r) for r in s.compute_toplevel('DefaultCompute', 'suc zero') if str(r) != '']
+    assert expr.endswith('(Cmd_compute_toplevel DefaultCompute "suc zero")')
+
+    # Commands are answered before the next one is sent, there is never one to abort
+    assert not hasattr(s, 'abort')
+    assert [r.kind for r in s.constraints()] == ['Status', 'DisplayInfo']
+  assert not s.alive()
+
+
+def test_session_batch(agda, source):
+  with Session(source, agda=agda, flags=['--hold']) as s:
+    with s.commands.batch() as batch:
+      for i in range(3):
+        s.commands.goal_type_context('Simplified', i, Range(), '')
+    results = s.send_batch(batch)
+
+    # All three answers arrive together, each command still gets only its own
+    assert [len(r) for r in results] == [2, 2, 2]
+    assert [r[1].goalInfo['type'] for r in results] == ['0', '1', '2']
+    assert all([record.latency > 0 for record in batch.records])
+
+
+def test_session_exit(agda, source):
+  with Session(source, agda=agda) as s:
+    with pytest.raises(SessionError):
+      s.compute_toplevel('DefaultCompute', 'die')
+
+
+def test_agda_session(agda, source):
+  async def run():
+    async with AgdaSession(source, agda=agda) as s:
+      # Written one after the other without waiting, each future gets the answer to its own command
+      load = s.load([])
+      queries = [s.compute_toplevel('DefaultCompute', f'x{i}') for i in range(5)]
+      await s.drain()
+      responses = await asyncio.gather(load, *queries)
+      records = list(s.commands.history)
+    return responses, records
+
+  responses, records = asyncio.run(run())
+  assert [r.kind for r in responses[0]] == ['Status', 'InteractionPoints', 'DisplayInfo']
+  assert [str(r[1]).endswith(f'"x{i}")') for i, r in enumerate(responses[1:])] == [True] * 5
+  assert all([r.latency > 0 for r in records])
+
+
+def test_agda_session_batch(agda, source):
+  async def run():
+    async with AgdaSession(source, agda=agda, flags=['--hold']) as s:
+      with s.commands.batch() as batch:
+        for i in range(3):
+          s.commands.goal_type_context('Simplified', i, Range(), '')
+      return await s.send_batch(batch)
+
+  assert [r[1].goalInfo['type'] for r in asyncio.run(run())] == ['0', '1', '2']
+
+
+def test_agda_session_abort(agda, source):
+  async def run():
+    async with AgdaSession(source, agda=agda, flags=['--hold']) as s:
+      # Aborting while idle sends nothing, the command running next keeps only its own responses
+      s.abort()
+      running = s.compute_toplevel('DefaultCompute', 'slow')
+      s.abort()
+      rest = [s.compute_toplevel('DefaultCompute', f'x{i}') for i in range(3)]
+      return await running, await asyncio.gather(*rest)
+
+  running, rest = asyncio.run(run())
+  assert [r.kind for r in running] == ['Status', 'DisplayInfo', 'DoneAborting']
+  assert [[r.kind for r in responses] for responses in rest] == [['Status', 'DisplayInfo']] * 3
+
+
+def test_agda_session_exit(agda, source):
+  async def run():
+    async with AgdaSession(source, agda=agda) as s:
+      await s.compute_toplevel('DefaultCompute', 'die')
+
+  with pytest.raises(SessionError):
+    asyncio.run(run())
+
+
+def test_pool(agda, tmp_path):
+  log = str(tmp_path / 'commands.log')
+  files = []
+  for name in ['A', 'B', 'C']:
+    f = tmp_path / f'{name}.agda'
+    f.write_text(f'module {name} where\n')
+    files.append(str(f))
+  loads = lambda f: [line for line in open(log).read().splitlines() if 'Cmd_load' in line and f'"{f}"' in line]
+
+  with SessionPool(size=2, agda=agda, flags=['--log', log]) as pool:
+    # Sessions are started and load their file on first use, later requests for the file go to the same session
+    a = pool.session(files[0])
+    assert pool.session(files[0]) is a
+    assert pool.session(files[1]) is not a
+    assert (pool.hits, pool.misses, len(pool)) == (1, 2, 2)
+    assert len(loads(files[0])) == 1
+
+    # Changing the file makes its session load it again
+    os.utime(files[0], (1, 1))
+    assert pool.session(files[0]) is a
+    assert len(loads(files[0])) == 2
+
+    # B was used least recently and makes room for C
+    b = pool.sessions[(os.path.abspath(files[1]), ('--log', log))]
+    pool.send(Commands(files[2]).constraints())
+    assert len(pool) == 2 and not b.alive() and a.alive()
+    assert sorted([k[0] for k in pool.sessions]) == [files[0], files[2]]
+  assert not a.alive()
+
+
+def test_pool_memory(agda, tmp_path, monkeypatch):
+  for name in ['A', 'B']:
+    (tmp_path / f'{name}.agda').write_text(f'module {name} where\n')
+  monkeypatch.chdir('/')
+
+  # Relative to the pool's directory, and only loaded files take memory
+  with SessionPool(memory=150, agda=agda, cwd=str(tmp_path)) as pool:
+    pool.memory_usage = lambda: 100 * len([s for s in pool.sessions.values() if s.loaded is not None])
+    a = pool.session('A.agda')
+    b = pool.session('B.agda')
+    assert not a.alive() and b.alive()
+    assert [k[0] for k in pool.sessions] == [str(tmp_path / 'B.agda')]
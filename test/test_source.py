@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import sys
+sys.path.insert(0, '.')
+
+from src.source import *
+
+def test_imports():
+  assert imports(open('./test/test.agda').read()) == ['Agda.Builtin.Nat']
+
+def test_imports_skip_comments():
+  code = '{- import A {- import B -} import C -}\nopen import D.E using (x) -- import F\nimport G as H; import I\n'
+  assert imports(code) == ['D.E', 'G', 'I']
+
+def test_illiterate_markdown():
+  text = 'import A\n```agda\nopen import B\n```\n```haskell\nimport C\n```\n'
+  code = illiterate(text, 'X.lagda.md')
+  assert len(code) == len(text)
+  assert imports(text, 'X.lagda.md') == ['B']
+
+def test_illiterate_latex():
+  text = 'import A\n\\begin{code}\nopen import B\n\\end{code}\n'
+  assert imports(text, 'X.lagda.tex') == ['B']
+
+def test_closure():
+  assert closure('./test/test.agda', ['./test']) == {}
+
+def test_line_index():
+  text = open('./test/test.agda', encoding='utf-8').read()
+  lines = line_index('./test/test.agda')
+  assert len(lines) == len(text.split('\n'))
+
+  # Offsets count code points from 1, `proof₁ = ?` follows lines with `→` and `∀`
+  offset = lines.offset(12, 10)
+  assert text[offset - 1] == '?'
+  assert lines.position(offset) == (12, 10)
+  assert lines.position(1) == (1, 1)
+
+def test_line_index_changes(tmp_path):
+  f = str(tmp_path / 'A.agda')
+  open(f, 'w').write('a\nb\n')
+  assert lines_of(f) == 3
+  open(f, 'w').write('a\nb\nc→\nd\n')
+  assert lines_of(f) == 5
+  assert line_index(f).offset(4, 1) == 8
+
+def lines_of(f):
+  return len(line_index(f))
+
+def test_holes(tmp_path):
+  f = str(tmp_path / 'A.agda')
+  code = 'f = ?\n-- ?\n{- ? {- ? -} ? -}\n{-# OPTIONS --a? #-}\ng = "?" ; c = \'?\'\nh = {! x {! y !} !} a?b (?)\n'
+  open(f, 'w').write(code)
+  found = holes(f)
+  assert [h.id for h in found] == [0, 1, 2]
+  assert [code[h.start - 1:h.end - 1] for h in found] == ['?', '{! x {! y !} !}', '?']
+  assert (found[1].line, found[1].column, found[1].endLine, found[1].endColumn) == (6, 5, 6, 20)
+
+def test_holes_literate():
+  text = '? is not a hole\n```agda\nf = ?\n```\n'
+  assert [(h.line, h.column) for h in HoleIndex().holes('A.lagda.md', text)] == [(3, 5)]
+
+def test_holes_edits():
+  index = HoleIndex()
+  text = 'f = ?\ng = {! a !}\n-- h = ?\nk = ?\n'
+  edits = ['f = ?\ng = {! a !}\n{- h = ?\nk = ?\n', 'f = ?\ng = {! a !}\n{- h = ? -}\nk = ?\n', '?\ng = {! a !}\n{- h = ? -}\nk = "?"\n']
+  for text in [text] + edits:
+    assert [(h.start, h.end) for h in index.holes('A.agda', text)] == [(h.start, h.end) for h in HoleIndex().holes('A.agda', text)]
+  assert len(index.holes('A.agda', edits[0])) == 2
+  assert len(index.holes('A.agda', edits[1])) == 3
+
+def test_include_root(tmp_path):
+  f = tmp_path / 'src' / 'Foo' / 'Bar.agda'
+  f.parent.mkdir(parents=True)
+  f.write_text('{- module X.Y -}\nmodule Foo.Bar where\n')
+  assert include_root(str(f)) == str(tmp_path / 'src')
+  f.write_text('module Bar where\n')
+  assert include_root(str(f)) == str(tmp_path / 'src' / 'Foo')